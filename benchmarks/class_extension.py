@@ -0,0 +1,67 @@
+"""
+Times ClassExtension.super() against plain method calls.
+
+    python benchmarks/class_extension.py [depth ...]
+
+For each depth a class is extended depth times, each extension calling the
+one before it through ClassExtension.super(), and a call through the whole
+chain is compared with the same chain of subclasses calling their base
+class.  Times are per link of the chain, so they should not grow with the
+depth.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins import ClassExtension  # noqa: E402
+
+CALLS = 100000
+
+
+def original():
+    class Parser:
+        def parse(self, value):
+            return value + 1
+    return Parser
+
+
+def extension(class_):
+    class Extension:
+        def parse(self, value):
+            return class_.__extension__.super(
+                Extension.parse, self, value) + 1
+    return Extension
+
+
+def override(base):
+    class Override(base):
+        def parse(self, value):
+            return base.parse(self, value) + 1
+    return Override
+
+
+def per_link(parser, depth):
+    seconds = min(timeit.repeat(
+        lambda: parser.parse(0), number=CALLS, repeat=5))
+    return seconds / CALLS / max(depth, 1) * 1e6
+
+
+def main(depths):
+    print('depth   super() usec/link   plain usec/link')
+    for depth in depths:
+        extended = original()
+        extension_ = ClassExtension.get(extended)
+        for _ in range(depth):
+            extension_.extend_class(extension(extended))
+        plain = original()
+        for _ in range(depth):
+            plain = override(plain)
+        assert extended().parse(0) == plain().parse(0) == depth + 1
+        print('{:5d}   {:17.3f}   {:15.3f}'.format(
+            depth, per_link(extended(), depth), per_link(plain(), depth)))
+
+
+if __name__ == '__main__':
+    main([int(depth) for depth in sys.argv[1:]] or [1, 8, 32])
@@ -18,14 +18,58 @@ def get_version():
     return version
 
 
+class TimestampParser:
+    """
+    Parses everquest log entries into (datetime, text).
+
+    '[Mon Oct 18 18:00:00 2026]' is read by slicing instead of strptime and
+    the previous result is reused while only the seconds field changes.
+    """
+
+    MONTHS = {
+        'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+        'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+    }
+
+    def __init__(self):
+        # one tuple so threads sharing a parser never see half an update
+        self._last = ('', None)  # (stamp, datetime)
+
+    def parse(self, line):
+        index = line.find("]") + 1
+        stamp = line[1:index - 1].strip()
+        text = line[index:].strip()
+        return self.parse_stamp(stamp), text
+
+    def parse_stamp(self, stamp):
+        """Returns the datetime of the text between the brackets."""
+        last_stamp, last_datetime = self._last
+        if stamp == last_stamp:
+            return last_datetime
+        if len(stamp) == 24 and stamp[:17] == last_stamp[:17] and \
+                stamp[19:] == last_stamp[19:]:
+            timestamp = last_datetime.replace(second=int(stamp[17:19]))
+        else:
+            try:
+                timestamp = datetime(
+                    int(stamp[20:24]), self.MONTHS[stamp[4:7]],
+                    int(stamp[8:10]), int(stamp[11:13]), int(stamp[14:16]),
+                    int(stamp[17:19])
+                )
+            except (KeyError, ValueError):
+                timestamp = datetime.strptime(stamp, '%a %b %d %H:%M:%S %Y')
+        self._last = (stamp, timestamp)
+        return timestamp
+
+
+_timestamp_parser = TimestampParser()
+
+
 def parse_line(line):
     """
     Parses and then returns an everquest log entry's date and text.
     """
-    index = line.find("]") + 1
-    sdate = line[1:index - 1].strip()
-    text = line[index:].strip()
-    return datetime.strptime(sdate, '%a %b %d %H:%M:%S %Y'), text
+    return _timestamp_parser.parse(line)
 
 
 def strip_timestamp(line):
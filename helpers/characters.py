@@ -0,0 +1,34 @@
+"""
+The main character, whose spells and location are shown as __you__.
+
+It is the character of the first line parsed, or the last to log in when
+several characters are boxed.  The parsers all ask main() so they always
+agree on it.
+"""
+from helpers import events
+
+_main = None
+
+
+def main():
+    """Returns the name of the main character, or None before any line."""
+    return _main
+
+
+def seen(charname):
+    """Makes charname the main character when there is none yet."""
+    global _main
+    if _main is None and charname:
+        _main = charname
+
+
+def logged_in(event):
+    """Makes the character logging in the main character."""
+    global _main
+    if event.charname:
+        _main = event.charname
+
+
+def routes():
+    """Returns the routes keeping main() current, ahead of the parsers."""
+    return [(events.LoggedIn, logged_in)]
@@ -0,0 +1,143 @@
+"""
+Clock used by the parsers for the current time and their timers.
+
+Normally this is the real clock.  A log replay installs a VirtualClock,
+which only moves when advanced to the time of the line being replayed, so
+timers fire in log time however fast the log is played back.
+"""
+import datetime
+import heapq
+from itertools import count
+
+from PyQt5 import sip
+from PyQt5.QtCore import QTimer
+
+
+class Clock:
+    """Wall clock time and QTimer timers."""
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def single_shot(self, msec, callback):
+        QTimer.singleShot(msec, callback)
+
+    def timer(self, callback):
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(callback)
+        return timer
+
+
+class VirtualClock(Clock):
+    """Time that only moves when advance() is called."""
+
+    def __init__(self, start):
+        self._now = start
+        self._queue = []  # [(due, sequence, _Shot)]
+        self._sequence = count()
+        self._handed_to = None  # Clock running the timers after hand_over()
+
+    def now(self):
+        return self._now
+
+    def single_shot(self, msec, callback):
+        timer = VirtualTimer(self, callback)
+        timer.start(msec)
+
+    def timer(self, callback):
+        return VirtualTimer(self, callback)
+
+    def advance(self, moment):
+        """Moves time forward to moment, firing timers due on the way."""
+        while self._queue and self._queue[0][0] <= moment:
+            due, _, shot = heapq.heappop(self._queue)
+            self._now = max(self._now, due)
+            shot.fire()
+        self._now = max(self._now, moment)
+
+    def hand_over(self, clock_):
+        """
+        Moves the timers still due to clock_, which also runs timers
+        started from now on, so timers outlive the replay.
+        """
+        self._handed_to = clock_
+        queue, self._queue = sorted(self._queue), []
+        for due, _, shot in queue:
+            self._schedule(shot, (due - self._now).total_seconds() * 1000)
+
+    def _schedule(self, shot, msec):
+        if self._handed_to is not None:
+            # a lambda, Qt only keeps a weak reference to bound methods
+            self._handed_to.single_shot(
+                max(0, int(msec)), lambda: shot.fire())
+            return
+        due = self._now + datetime.timedelta(milliseconds=max(0, msec))
+        heapq.heappush(self._queue, (due, next(self._sequence), shot))
+
+
+class VirtualTimer:
+    """Single shot timer on a VirtualClock, mirrors the QTimer calls used."""
+
+    def __init__(self, clock_, callback):
+        self._clock = clock_
+        self._callback = callback
+        self._active = False
+        self._generation = 0
+
+    def start(self, msec):
+        self._generation += 1
+        self._active = True
+        self._clock._schedule(_Shot(self, self._generation), msec)
+
+    def stop(self):
+        self._active = False
+
+    def isActive(self):
+        return self._active
+
+
+class _Shot:
+    """One start() of a VirtualTimer, stale once the timer is restarted."""
+
+    def __init__(self, timer, generation):
+        self.timer = timer
+        self.generation = generation
+
+    def fire(self):
+        timer = self.timer
+        if not timer._active or timer._generation != self.generation:
+            return
+        timer._active = False
+        # like QTimer, do not call into deleted Qt objects
+        receiver = getattr(timer._callback, '__self__', None)
+        if isinstance(receiver, sip.simplewrapper) and sip.isdeleted(receiver):
+            return
+        timer._callback()
+
+
+_clock = Clock()
+
+
+def install(clock_):
+    """
+    Makes clock_ the clock used by now(), single_shot() and timer() and
+    returns the clock it replaces.
+    """
+    global _clock
+    previous, _clock = _clock, clock_
+    return previous
+
+
+def now():
+    return _clock.now()
+
+
+def single_shot(msec, callback):
+    """Calls callback once after msec."""
+    _clock.single_shot(msec, callback)
+
+
+def timer(callback):
+    """Returns a stopped single shot timer with start(msec), stop() and isActive()."""
+    return _clock.timer(callback)
@@ -72,6 +72,53 @@ def verify_settings():
         data['general'].get('safe_mode', True),
         True
     )
+    data['general']['plugin_budget'] = get_setting(
+        data['general'].get('plugin_budget', 50),
+        50,
+        lambda x: (x >= 0 and x <= 5000)
+    )
+    data['general']['plugin_budget_unload'] = get_setting(
+        data['general'].get('plugin_budget_unload', False),
+        False
+    )
+    data['general']['isolated_plugins'] = get_setting(
+        data['general'].get('isolated_plugins', []),
+        []
+    )
+    data['general']['log_batch_size'] = get_setting(
+        data['general'].get('log_batch_size', 200),
+        200,
+        lambda x: (x >= 1 and x <= 5000)
+    )
+    data['general']['log_flush_latency'] = get_setting(
+        data['general'].get('log_flush_latency', 50),
+        50,
+        lambda x: (x >= 0 and x <= 1000)
+    )
+    data['general']['log_watcher'] = get_setting(
+        data['general'].get('log_watcher', 'auto'),
+        'auto',
+        lambda x: x in ('auto', 'qt', 'inotify', 'polling')
+    )
+    data['general']['catchup_minutes'] = get_setting(
+        data['general'].get('catchup_minutes', 10),
+        10,
+        lambda x: (x >= 0 and x <= 1440)
+    )
+    data['general']['catchup_max_mb'] = get_setting(
+        data['general'].get('catchup_max_mb', 5),
+        5,
+        lambda x: (x >= 0 and x <= 50)
+    )
+    data['general']['log_queue_limit'] = get_setting(
+        data['general'].get('log_queue_limit', 5000),
+        5000,
+        lambda x: (x >= 0 and x <= 100000)
+    )
+    data['general']['log_prefilter'] = get_setting(
+        data['general'].get('log_prefilter', True),
+        True
+    )
 
     # maps
     data['maps'] = data.get('maps', {})
@@ -207,6 +254,10 @@ def verify_settings():
         data['spells'].get('save_spells', False),
         False
         )
+    data['spells']['track_others'] = get_setting(
+        data['spells'].get('track_others', False),
+        False
+        )
 
     # caoilainn fork
     # log streaming
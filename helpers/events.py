@@ -0,0 +1,193 @@
+"""
+Typed events classified from log lines.
+
+Each line is classified once into at most one event, with its fields
+already extracted, so handlers never test the text again.  Every line is
+also available as a Line event for handlers that need all of them.  Events
+wrap the helpers.logline.LogLine, so its timestamp is still only parsed
+when a handler reads it.
+"""
+
+
+class LogEvent:
+    """A log line, subclasses say which lines they are and extract fields."""
+
+    prefixes = ()  # message prefixes, each starting with a whole word
+    literals = ()  # text found anywhere in the message instead of a prefix
+
+    def __init__(self, line):
+        self.line = line
+        self.text = line.text
+        self.charname = line.charname
+
+    @property
+    def timestamp(self):
+        return self.line.timestamp
+
+    def parse(self):
+        """Extracts the fields from text, False when it is not this event."""
+        return True
+
+
+class Line(LogEvent):
+    """Every line, before it is classified."""
+
+
+class LoggedIn(LogEvent):
+    prefixes = ('Welcome to EverQuest',)
+
+
+class Zoning(LogEvent):
+    prefixes = ('LOADING, PLEASE WAIT...',)
+
+
+class ZoneEntered(LogEvent):
+    prefixes = ('You have entered',)
+
+    def parse(self):
+        if self.text[:24] == 'You have entered an area':
+            return False  # levitation and similar area messages
+        self.zone = self.text[17:-1]
+        return True
+
+
+class Location(LogEvent):
+    prefixes = ('Your Location is',)
+
+    def parse(self):
+        try:
+            self.x, self.y, self.z = [
+                float(value) for value in self.text[17:].strip().split(',')]
+        except ValueError:
+            return False
+        return True
+
+
+class CastBegin(LogEvent):
+    prefixes = ('You begin casting',)
+
+    def parse(self):
+        self.spell_name = self.text[18:-1]
+        return True
+
+
+class CastInterrupted(LogEvent):
+    prefixes = ('Your spell is interrupted.',)
+
+
+class CastFailed(LogEvent):
+    prefixes = (
+        'Your target resisted',
+        'Your spell did not take hold.',
+        'You try to cast a spell on',
+    )
+
+
+class LevelUp(LogEvent):
+    prefixes = ('You have gained a level!',)
+
+    def parse(self):
+        try:
+            self.level = int(self.text.rsplit(' ', 1)[-1].rstrip('!'))
+        except ValueError:
+            return False
+        return True
+
+
+class Afk(LogEvent):
+    prefixes = ('You are now A.F.K.', 'You are no longer A.F.K.')
+
+    def parse(self):
+        self.afk = self.text[:12] == 'You are now '
+        return True
+
+
+class CampStart(LogEvent):
+    prefixes = ('It will take about 5 more seconds to prepare your camp',)
+
+
+class CampAbort(LogEvent):
+    prefixes = ('You abandon your preparations to camp',)
+
+
+class Death(LogEvent):
+    """Someone, or us, died."""
+
+    prefixes = ('You died.',)
+    literals = (' been slain by ',)
+
+
+class Tell(LogEvent):
+    literals = (' tells you, ',)
+
+    def parse(self):
+        source, _, message = self.text.partition(' tells you, ')
+        if not message:
+            return False
+        self.source = source
+        self.message = message.strip("'")
+        return True
+
+
+class SpellWornOff(LogEvent):
+    """One of our spells wore off of target, when the client names it."""
+
+    literals = (' spell has worn off',)
+
+    def parse(self):
+        if self.text[:5] != 'Your ':
+            return False
+        self.spell_name, found, rest = self.text[5:].partition(
+            ' spell has worn off')
+        if not found:
+            return False
+        rest = rest.rstrip('.')
+        self.target = rest[4:] if rest[:4] == ' of ' else None
+        return True
+
+
+EVENTS = (LoggedIn, Zoning, ZoneEntered, Location, CastBegin,
+          CastInterrupted, CastFailed, LevelUp, Afk, CampStart, CampAbort,
+          Death, Tell, SpellWornOff)
+
+_by_word = {}  # first word of a prefix : [(prefix, event type)]
+_by_literal = []  # [(literal, event type)]
+for _event in EVENTS:
+    for _prefix in _event.prefixes:
+        _by_word.setdefault(_prefix.split(' ', 1)[0], []).append(
+            (_prefix, _event))
+    for _literal in _event.literals:
+        _by_literal.append((_literal, _event))
+
+
+def classify(line, wanted=None):
+    """
+    Returns the LogEvent for a LogLine, or None when it is none of EVENTS
+    or not one of the wanted event types.
+    """
+    text = line.text
+    space = text.find(' ')
+    for prefix, event_type in _by_word.get(
+            text if space < 0 else text[:space], ()):
+        if text.startswith(prefix):
+            if wanted is not None and event_type not in wanted:
+                return None
+            event = event_type(line)
+            return event if event.parse() else None
+    for literal, event_type in _by_literal:
+        if (wanted is None or event_type in wanted) and literal in text:
+            event = event_type(line)
+            if event.parse():
+                return event
+    return None
+
+
+def line_filter(event_types):
+    """Returns the LineFilter arguments for lines of event_types."""
+    prefixes, literals = [], []
+    for event_type in event_types:
+        if event_type is Line:
+            return None
+        prefixes.extend(event_type.prefixes)
+        literals.extend(event_type.literals)
+    return {'prefixes': prefixes, 'literals': literals}
@@ -0,0 +1,46 @@
+"""
+Priority lanes for log lines while the parsers are behind.
+
+Lines that are events (zone changes, casts, deaths, tells, see
+helpers.events) are critical and always delivered.  Chat channels and
+melee spam are low value and shed when the queue is over its limit,
+unless the line filter wants them.  Every other line is delivered, it may
+be a spell landing, a worn off message or a trigger.
+"""
+import re
+
+from helpers import events
+from helpers.logline import LogLine
+
+CRITICAL, NORMAL, LOW = range(3)
+
+LOW_VALUE = re.compile(
+    r"[\w ]+? (?:says? out of character|auctions?|shouts?|tells \w+:\d+), '"
+    r"|.+ for \d+ points? of (?:non-melee )?damage\.$"
+    r"|.+ tries to \w+ .+, but .+!$"
+    r"|You try to \w+ .+, but miss!$"
+)
+
+
+def lane(text):
+    """Returns the lane of a line's text."""
+    if events.classify(LogLine(None, text, None)) is not None:
+        return CRITICAL
+    if LOW_VALUE.match(text):
+        return LOW
+    return NORMAL
+
+
+def shed(records, depth, limit, line_filter=None):
+    """
+    Returns (kept, shed count) of LogLine records joining a queue already
+    depth lines deep.  Lines line_filter (a LineFilter) wants are kept.
+    """
+    kept = []
+    for record in records:
+        if limit and depth + len(kept) >= limit and \
+                lane(record.text) == LOW and \
+                (line_filter is None or not line_filter.wants_text(record.text)):
+            continue
+        kept.append(record)
+    return kept, len(records) - len(kept)
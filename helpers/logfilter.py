@@ -0,0 +1,76 @@
+"""
+Byte level prefilter for log lines.
+
+Parsers describe the lines they care about with message prefixes, literals
+that may appear anywhere in the message in any case, and window prefixes
+after which every line is wanted for a number of seconds (a spell landing
+follows the cast).  Lines are checked before they are decoded, so chat and melee spam
+never reach the parsers.
+"""
+import re
+
+from helpers.logreader import LOG_ENCODING
+from helpers.triggers import literal_pattern
+
+
+class LineFilter:
+    """Decides from the raw bytes of a line whether it is wanted."""
+
+    def __init__(self, prefixes=(), literals=(), windows=None):
+        windows = windows or {}
+        self.prefixes = tuple(_encode(prefix) for prefix in
+                              set(prefixes) | set(windows))
+        literals = set(_decode(literal) for literal in literals if literal)
+        self.literals = re.compile(
+            _encode(literal_pattern(literals)), re.IGNORECASE) \
+            if literals else None
+        self.windows = [(_encode(prefix), seconds)
+                        for prefix, seconds in windows.items()]
+
+    @classmethod
+    def combine(cls, filters):
+        """
+        Returns one LineFilter wanting every line any of filters want, or
+        None when any of them wants every line.
+        """
+        prefixes, literals, windows = set(), set(), {}
+        for line_filter in filters:
+            if line_filter is None:
+                return None
+            prefixes.update(line_filter['prefixes'])
+            literals.update(line_filter.get('literals', ()))
+            for prefix, seconds in line_filter.get('windows', {}).items():
+                windows[prefix] = max(seconds, windows.get(prefix, 0))
+        return cls(prefixes, literals, windows)
+
+    def wants(self, line):
+        start = line.find(b'] ') + 2
+        if start < 2:
+            return True  # no timestamp, let the parsers see it
+        return self._wants(line, start)
+
+    def wants_text(self, text):
+        """Returns True when the message text of a decoded line is wanted."""
+        return self._wants(_encode(text), 0)
+
+    def _wants(self, line, start):
+        if line.startswith(self.prefixes, start):
+            return True
+        return self.literals is not None and \
+            self.literals.search(line, start) is not None
+
+    def window(self, line):
+        """Returns the seconds every line is wanted for after line, or 0."""
+        start = line.find(b'] ') + 2
+        for prefix, seconds in self.windows:
+            if line.startswith(prefix, start):
+                return seconds
+        return 0
+
+
+def _encode(text):
+    return text.encode(LOG_ENCODING) if isinstance(text, str) else text
+
+
+def _decode(text):
+    return text.decode(LOG_ENCODING) if isinstance(text, bytes) else text
@@ -0,0 +1,45 @@
+"""
+Log line records handed from the readers to the parsers.
+"""
+import datetime
+
+from helpers import TimestampParser
+
+_timestamps = TimestampParser()
+
+
+class LogLine:
+    """
+    A line of charname's log, offset bytes into it (None when unknown).
+
+    timestamp is a datetime, or the text between the brackets of the line,
+    which is only parsed when first asked for.  charname is interned by the
+    readers, so lines of the same character share one string and can be
+    compared with is.  Unpacks as (timestamp, text, charname).
+    """
+
+    __slots__ = ('_timestamp', 'text', 'charname', 'offset')
+
+    def __init__(self, timestamp, text, charname, offset=None):
+        self._timestamp = timestamp
+        self.text = text
+        self.charname = charname
+        self.offset = offset
+
+    @property
+    def timestamp(self):
+        timestamp = self._timestamp
+        if timestamp.__class__ is str:
+            try:
+                timestamp = _timestamps.parse_stamp(timestamp)
+            except ValueError:
+                timestamp = datetime.datetime.now()
+            self._timestamp = timestamp
+        return timestamp
+
+    def __iter__(self):
+        return iter((self.timestamp, self.text, self.charname))
+
+    def __repr__(self):
+        return 'LogLine({!r}, {!r}, {!r})'.format(
+            self.timestamp, self.text, self.charname)
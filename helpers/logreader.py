@@ -1,51 +1,527 @@
 import os
 import re
+import sys
+import json
+import mmap
 import datetime
 from glob import glob
 
-from PyQt5.QtCore import QFileSystemWatcher, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal
 
-from helpers import strip_timestamp
+from helpers import lanes
+from helpers.logline import LogLine
+from helpers.logwatch import LOG_PATTERN, create_watcher
 
+CHUNK_SIZE = 64 * 1024  # read buffer size
+LOG_ENCODING = 'latin-1'
+OFFSETS_FILE = 'nparse.offsets.json'
+OFFSETS_SAVE_INTERVAL = 5000  # msec
+MMAP_THRESHOLD = 1024 * 1024  # unread bytes before reading through mmap
+MMAP_WINDOW = 16 * 1024 * 1024
 
-class LogReader(QFileSystemWatcher):
 
-    character_name_regex = re.compile(r'eqlog_([A-Za-z]*?)_')
-    new_line = pyqtSignal(object)
+class LogReader(QObject):
+    """
+    Tails every EverQuest log at once on a worker thread.
+
+    Lines are delivered in batches through new_lines as a list of LogLine
+    records stamped with the log's own time.
+    When more than queue_limit lines are waiting to be parsed, low value
+    lines that keep_filter does not want are shed (see helpers.lanes).  With restore_state, the last zone,
+    location and level of the newest log are sent first (see
+    helpers.logscan).
+    """
 
-    def __init__(self, eq_directory):
+    new_lines = pyqtSignal(object)
+    _stop_requested = pyqtSignal()
+    _filter_changed = pyqtSignal(object, object)
+    _parsed = pyqtSignal(int)
+
+    def __init__(self, eq_directory, batch_size=200, flush_latency=50,
+                 catchup_minutes=0, catchup_max_mb=0, watcher='auto',
+                 line_filter=None, queue_limit=0, restore_state=False,
+                 keep_filter=None):
         super().__init__()
 
-        self._files = glob(os.path.join(eq_directory, 'eqlog*.txt'))
-        self._watcher = QFileSystemWatcher(self._files)
-        self._watcher.fileChanged.connect(self._file_changed)
+        self._thread = QThread()
+        self._tailer = LogTailer(
+            eq_directory, batch_size, flush_latency,
+            catchup_minutes, catchup_max_mb, watcher, line_filter,
+            queue_limit, restore_state, keep_filter)
+        self._tailer.moveToThread(self._thread)
+        self._tailer.new_lines.connect(self._deliver, Qt.QueuedConnection)
+        self._parsed.connect(self._tailer.batch_parsed, Qt.QueuedConnection)
+        self._stop_requested.connect(self._tailer.stop, Qt.QueuedConnection)
+        self._filter_changed.connect(
+            self._tailer.set_filter, Qt.QueuedConnection)
+        self._thread.started.connect(self._tailer.start)
+        self._thread.finished.connect(self._tailer.deleteLater)
+        self._thread.start()
 
-        self._stats = {
-            'log_file': '',
-            'char': '',
-            'last_read': 0,
-        }
+    def stop(self):
+        """Flushes pending lines and waits for the worker thread to exit."""
+        if self._thread.isRunning():
+            self._stop_requested.emit()
+            self._thread.wait()
+
+    def set_filter(self, line_filter, keep_filter=None):
+        """
+        Replaces the LineFilter, None decodes every line, and the
+        LineFilter of the lines never shed.
+        """
+        self._filter_changed.emit(line_filter, keep_filter)
+
+    def _deliver(self, batch):
+        self.new_lines.emit(batch)
+        # the receivers are done with it, it leaves the queue
+        self._parsed.emit(len(batch))
+
+    def stats(self):
+        """Returns [(label, value)] describing the reader."""
+        return self._tailer.stats()
+
+
+class LogTailer(QObject):
+    """Watches and reads the log files.  Lives on the LogReader thread."""
+
+    new_lines = pyqtSignal(object)
+
+    def __init__(self, eq_directory, batch_size, flush_latency,
+                 catchup_minutes, catchup_max_mb, watcher, line_filter,
+                 queue_limit, restore_state, keep_filter):
+        super().__init__()
+        self._eq_directory = eq_directory
+        self._restore_state = restore_state
+        self._filter = line_filter
+        self._keep_filter = keep_filter
+        self._lines = 0  # lines read from logs since closed
+        self._skipped = 0
+        self._queue_limit = max(0, queue_limit)
+        self._in_flight = 0  # lines sent and not parsed yet
+        self._peak_depth = 0
+        self._shed = 0
+        self._watcher_kind = watcher
+        self._batch_size = max(1, batch_size)
+        self._flush_latency = max(0, flush_latency)
+        self._catchup_minutes = catchup_minutes
+        self._catchup_max_bytes = catchup_max_mb * 1024 * 1024
+        self._offsets = LogOffsets(OFFSETS_FILE)
+        self._logs = {}  # path : LogFile
+        self._resume_offsets = {}  # path : offset to open logs at
+        self._changed = []  # paths waiting to be read
+        self._watcher = None
+        self._flush_timer = None
+        self._read_timer = None
+        self._save_timer = None
+        self._pending = []
+
+    def start(self):
+        # created here so they belong to the worker thread
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self._flush)
+        self._read_timer = QTimer(self)
+        self._read_timer.setSingleShot(True)
+        self._read_timer.timeout.connect(self._read_changed)
+        self._save_timer = QTimer(self)
+        self._save_timer.timeout.connect(self._offsets.save)
+        self._save_timer.start(OFFSETS_SAVE_INTERVAL)
+        self._offsets.load()
+        since = datetime.datetime.now() - \
+            datetime.timedelta(minutes=self._catchup_minutes)
+        if self._restore_state:
+            self._restore(since)
+        files = self._glob()
+        for log_file in sorted(files, key=os.path.getmtime):
+            if not self._catch_up(log_file, since):
+                self._resume_offsets[log_file] = os.path.getsize(log_file)
+        self._flush()
+        self._watcher = create_watcher(
+            self._watcher_kind, self._eq_directory, self)
+        self._watcher.add_paths(files)
+        self._watcher.file_changed.connect(self._file_changed)
+        self._watcher.directory_changed.connect(self._directory_changed)
+
+    def stop(self):
+        self._flush_timer.stop()
+        self._read_timer.stop()
+        self._save_timer.stop()
+        self._read_changed()
+        self._flush()
+        self._offsets.save()
+        self._watcher.stop()
+        self._watcher.file_changed.disconnect(self._file_changed)
+        self._watcher.directory_changed.disconnect(self._directory_changed)
+        for log in self._logs.values():
+            log.close()
+        self._logs = {}
+        self.thread().quit()
+
+    def set_filter(self, line_filter, keep_filter):
+        self._filter = line_filter
+        self._keep_filter = keep_filter
+        for log in self._logs.values():
+            log.window = None
+
+    def batch_parsed(self, count):
+        self._in_flight -= count
+
+    def stats(self):
+        if self._watcher is None:
+            return []
+        logs = list(self._logs.values())
+        lines = self._lines + sum(log.lines for log in logs)
+        skipped = self._skipped + sum(log.skipped for log in logs)
+        return self._watcher.stats() + [
+            ('Lines Read', lines),
+            ('Lines Skipped', '{} ({:.0f}%)'.format(
+                skipped, skipped * 100 / lines if lines else 0)),
+            ('Queue Depth', '{} (peak {})'.format(
+                self._in_flight + len(self._pending), self._peak_depth)),
+            ('Lines Shed', '{} ({:.0f}%)'.format(
+                self._shed, self._shed * 100 / lines if lines else 0)),
+        ]
+
+    def _glob(self):
+        return glob(os.path.join(self._eq_directory, LOG_PATTERN))
+
+    def _open(self, log_file):
+        log = self._logs.get(log_file)
+        if log is None:
+            log = LogFile(log_file)
+            self._logs[log_file] = log
+        return log
+
+    def _close(self, log_file):
+        log = self._logs.pop(log_file, None)
+        if log:
+            self._lines += log.lines
+            self._skipped += log.skipped
+            log.close()
+
+    def _directory_changed(self, _):
+        """Picks up logs created after start, closes deleted ones."""
+        files = set(self._glob())
+        watched = set(self._watcher.files())
+        for log_file in files - watched:
+            self._watcher.add_paths([log_file])
+            try:
+                # a new log is read from the beginning
+                log = self._open(log_file)
+                lines = log.read_lines()
+                self._queue(self._decode(log, lines, log.read_offset))
+            except Exception:
+                self._close(log_file)
+        for log_file in set(self._logs) - files:
+            self._close(log_file)
+
+    def _restore(self, since):
+        """
+        Queues the last zone, location and level logged, ahead of the rest,
+        except the lines catching up from since will replay.
+        """
+        from helpers import logscan  # imports this module
+        log_file = logscan.newest_log(self._eq_directory)
+        if not log_file:
+            return
+        try:
+            records = logscan.last_state(log_file)
+            start = self._catch_up_start(log_file, os.stat(log_file))
+        except OSError:
+            return
+        if start is not None:
+            records = [record for record in records
+                       if record.offset < start or record.timestamp < since]
+        self._queue(records)
+
+    def _catch_up_start(self, log_file, stat):
+        """Returns the offset catching up on log_file reads from, or None."""
+        if not self._catchup_minutes or not self._catchup_max_bytes:
+            return None
+        offset = self._offsets.get(log_file, stat)
+        if offset is None or offset == stat.st_size:
+            return None
+        return max(offset, stat.st_size - self._catchup_max_bytes)
+
+    def _catch_up(self, log_file, since):
+        """Replays lines written since the saved offset, within limits."""
+        try:
+            stat = os.stat(log_file)
+            start = self._catch_up_start(log_file, stat)
+            if start is None:
+                return False
+            offset = self._offsets.get(log_file, stat)
+            log = self._open(log_file)
+            log.seek(start)
+            lines = log.read_lines()
+            line_offset = log.read_offset
+            if start != offset and lines:
+                # skip the partial line we landed in
+                line_offset += len(lines[0]) + 1
+                lines = lines[1:]
+        except Exception:  # skip logs that cannot be read
+            self._close(log_file)
+            return False
+
+        self._queue(self._decode(log, lines, line_offset, since=since))
+        self._offsets.set(log_file, log.offset, log.stat())
+        return True
 
     def _file_changed(self, changed_file):
-        if changed_file != self._stats['log_file']:
-            charmatch = self.character_name_regex.search(changed_file)
-            if charmatch.groups():
-                self._stats['char'] = charmatch.groups()[0]
-            self._stats['log_file'] = changed_file
-            with open(self._stats['log_file']) as log:
-                log.seek(0, os.SEEK_END)
-                self._stats['last_read'] = log.tell()
-        with open(self._stats['log_file']) as log:
+        # coalesce notifications so logs written together are read together
+        if changed_file not in self._changed:
+            self._changed.append(changed_file)
+        if not self._read_timer.isActive():
+            self._read_timer.start(0)
+
+    def _read_changed(self):
+        logs = []
+        for changed_file in self._changed:
             try:
-                log.seek(self._stats['last_read'], os.SEEK_SET)
-                lines = log.readlines()
-                self._stats['last_read'] = log.tell()
-                for line in lines:
-                    self.new_line.emit((
-                        datetime.datetime.now(),
-                        strip_timestamp(line),
-                        self._stats['char']
-                    ))
-            except Exception:  # do not read lines if they cause errors
-                log.seek(0, os.SEEK_END)
-                self._stats['last_read'] = log.tell()
+                log = self._logs.get(changed_file)
+                if log is None:
+                    log = self._open(changed_file)
+                    offset = self._resume_offsets.pop(changed_file, None)
+                    if offset is None:
+                        log.seek_end()
+                    elif offset <= log.stat().st_size:
+                        log.seek(offset)  # otherwise truncated, from start
+                logs.append(log)
+            except Exception:
+                self._close(changed_file)
+        self._changed = []
+
+        # logs written together are read in one pass on this thread, the
+        # decoding is pure Python so more threads would not run it faster
+        for log in logs:
+            records = self._read_log(log)
+            if records is None:
+                # reopen and carry on from the last complete line next time
+                self._resume_offsets[log.path] = log.offset
+                self._close(log.path)
+                continue
+            self._queue(records)
+            self._offsets.set(log.path, log.offset, log.stat())
+
+    def _read_log(self, log):
+        try:
+            lines = log.read_lines()
+            return self._decode(log, lines, log.read_offset)
+        except Exception:
+            return None
+
+    def _decode(self, log, lines, offset, since=None):
+        """
+        Returns LogLine records from log, skipping lines logged before since.
+        lines start offset bytes into the log, or offset is None.
+
+        With a filter, lines nobody wants are dropped before being decoded,
+        except within a window opened by an earlier line.  Timestamps are
+        only parsed here when a window or since needs them.
+        """
+        records = []
+        line_filter = self._filter
+        charname = log.charname
+        log.lines += len(lines)
+        for raw in lines:
+            line_offset = offset
+            if offset is not None:
+                offset += len(raw) + 1
+            if line_filter is not None and log.window is None and \
+                    not line_filter.wants(raw):
+                log.skipped += 1
+                continue
+            line = raw.decode(LOG_ENCODING)
+            index = line.find(']') + 1
+            if index:
+                record = LogLine(line[1:index - 1], line[index:].strip(),
+                                 charname, line_offset)
+            else:
+                record = LogLine(datetime.datetime.now(), line.strip(),
+                                 charname, line_offset)
+            if line_filter is not None:
+                if log.window is not None and record.timestamp > log.window:
+                    log.window = None
+                    if not line_filter.wants(raw):
+                        log.skipped += 1
+                        continue
+                seconds = line_filter.window(raw)
+                if seconds:
+                    log.window = record.timestamp + \
+                        datetime.timedelta(seconds=seconds)
+            if since and record.timestamp < since:
+                continue
+            records.append(record)
+        return records
+
+    def _queue(self, records):
+        depth = self._in_flight + len(self._pending)
+        if self._queue_limit and depth + len(records) > self._queue_limit:
+            records, shed = lanes.shed(
+                records, depth, self._queue_limit, self._keep_filter)
+            self._shed += shed
+        self._pending.extend(records)
+        self._peak_depth = max(
+            self._peak_depth, self._in_flight + len(self._pending))
+        while len(self._pending) >= self._batch_size:
+            batch = self._pending[:self._batch_size]
+            del self._pending[:self._batch_size]
+            self._send(batch)
+        if self._pending and not self._flush_timer.isActive():
+            self._flush_timer.start(self._flush_latency)
+
+    def _flush(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._send(batch)
+
+    def _send(self, batch):
+        self._in_flight += len(batch)
+        self.new_lines.emit(batch)
+
+
+class LogFile:
+    """
+    An open eqlog file and the offset of the first unread line.
+
+    Truncated logs are read again from the start.  When the log is replaced
+    (rotated or archived) the rest of the old file is read before the new
+    file is opened.  Large unread spans are read through mmap windows.
+    """
+
+    character_name_regex = re.compile(r'eqlog_([A-Za-z]*?)_')
+
+    def __init__(self, path):
+        self.path = path
+        charmatch = self.character_name_regex.search(path)
+        self.charname = sys.intern(charmatch.groups()[0] if charmatch else '')
+        self.window = None  # log time every line is wanted until
+        self.lines = 0
+        self.skipped = 0  # lines the filter dropped undecoded
+        self.read_offset = None  # of the first line read_lines() returned
+        self._open()
+
+    def _open(self):
+        self._handle = open(self.path, 'rb', buffering=CHUNK_SIZE)
+        self._inode = self.stat().st_ino
+        self._position = 0
+        self._remainder = b''
+
+    @property
+    def offset(self):
+        return self._position - len(self._remainder)
+
+    def stat(self):
+        return os.fstat(self._handle.fileno())
+
+    def seek(self, offset):
+        self._position = self._handle.seek(offset, os.SEEK_SET)
+        self._remainder = b''
+
+    def seek_end(self):
+        self._position = self._handle.seek(0, os.SEEK_END)
+        self._remainder = b''
+
+    def read_lines(self):
+        """Returns the complete lines written since the last read."""
+        lines = []
+        self.read_offset = self.offset
+        size = self.stat().st_size
+        if size < self._position:
+            self.seek(0)  # truncated in place
+            self.read_offset = 0
+        elif self._replaced():
+            lines = self._read(size)
+            if self._remainder:
+                lines.append(self._remainder)  # the old log is finished
+            self.close()
+            self._open()
+            size = self.stat().st_size
+            self.read_offset = None  # lines span two files
+        lines.extend(self._read(size))
+        return lines
+
+    def _replaced(self):
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return False  # moved away and not recreated yet, keep reading
+
+    def _read(self, size):
+        if size - self._position < MMAP_THRESHOLD:
+            data = self._handle.read()
+            chunks = [data] if data else []
+        else:
+            chunks = self._mmap_chunks(size)
+        lines = []
+        for chunk in chunks:
+            self._position += len(chunk)
+            split = (self._remainder + chunk).split(b'\n')
+            # leave partially written lines for the next notification
+            self._remainder = split.pop()
+            lines.extend(split)
+        self._handle.seek(self._position, os.SEEK_SET)
+        return lines
+
+    def _mmap_chunks(self, size):
+        """Yields the bytes from the position up to size, a window at a time."""
+        start = self._position
+        while start < size:
+            base = start - start % mmap.ALLOCATIONGRANULARITY
+            length = min(MMAP_WINDOW, size - base)
+            with mmap.mmap(self._handle.fileno(), length,
+                           access=mmap.ACCESS_READ, offset=base) as window:
+                chunk = window[start - base:]
+            yield chunk
+            start = base + length
+
+    def close(self):
+        self._handle.close()
+
+
+class LogOffsets:
+    """
+    Byte offsets read per log file, saved between runs.
+
+    Offsets are only handed back while the file has the same inode and has
+    not shrunk below the offset, otherwise the log was replaced.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._offsets = {}
+        self._dirty = False
+
+    def load(self):
+        try:
+            with open(self._filename, 'r') as f:
+                self._offsets = json.loads(f.read())
+        except Exception:
+            self._offsets = {}
+        self._dirty = False
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            with open(self._filename, 'w') as f:
+                f.write(json.dumps(self._offsets, indent=4, sort_keys=True))
+            self._dirty = False
+        except Exception:
+            pass
+
+    def get(self, log_file, stat):
+        saved = self._offsets.get(os.path.basename(log_file))
+        if not saved or saved.get('inode') != stat.st_ino:
+            return None
+        if stat.st_size < saved.get('offset', 0):
+            return None
+        return saved.get('offset')
+
+    def set(self, log_file, offset, stat):
+        self._offsets[os.path.basename(log_file)] = {
+            'offset': offset,
+            'inode': stat.st_ino,
+            'size': stat.st_size,
+        }
+        self._dirty = True
@@ -0,0 +1,96 @@
+"""
+Backward scan of a log for the character's state at startup.
+
+Reads the newest log from the end in blocks and stops once the most recent
+zone entry, the last location in that zone and the last level up are found.
+A character at max level has no level up to find, so the level is only
+looked for within LEVEL_SCAN_LIMIT of the end.
+"""
+import os
+import sys
+from glob import glob
+
+from helpers import TimestampParser
+from helpers.logline import LogLine
+from helpers.logreader import CHUNK_SIZE, LOG_ENCODING, LogFile
+from helpers.logwatch import LOG_PATTERN
+
+SCAN_LIMIT = 64 * 1024 * 1024  # bytes read before giving up
+LEVEL_SCAN_LIMIT = 4 * 1024 * 1024  # bytes read looking for a level up
+
+ZONE_PREFIX = b'You have entered '
+NOT_A_ZONE_PREFIX = b'You have entered an area'
+LOCATION_PREFIX = b'Your Location is '
+LEVEL_PREFIX = b'You have gained a level!'
+
+
+def newest_log(directory):
+    """Returns the most recently written eqlog file in directory, or None."""
+    logs = glob(os.path.join(directory, LOG_PATTERN))
+    if not logs:
+        return None
+    return max(logs, key=os.path.getmtime)
+
+
+def read_backwards(path, block_size=CHUNK_SIZE, limit=SCAN_LIMIT):
+    """
+    Yields (offset, line) for the complete lines of path as bytes, last
+    line first.
+    """
+    with open(path, 'rb') as log:
+        position = log.seek(0, os.SEEK_END)
+        stop = max(0, position - limit)
+        remainder = b''
+        while position > stop:
+            size = min(block_size, position - stop)
+            position -= size
+            log.seek(position, os.SEEK_SET)
+            data = log.read(size) + remainder
+            lines = data.split(b'\n')
+            # the first piece may be cut, keep it for the next block
+            remainder = lines.pop(0)
+            offset = position + len(data)
+            for line in reversed(lines):
+                offset -= len(line)
+                if line.strip():
+                    yield offset, line
+                offset -= 1  # the newline before it
+        if remainder.strip() and stop == 0:
+            yield 0, remainder
+
+
+def last_state(path):
+    """
+    Returns LogLine records in log order, holding the last
+    zone entry, the last location after it and the last level up.
+    """
+    found = {}  # prefix : (offset, line)
+    scanned = 0
+    for offset, line in read_backwards(path):
+        scanned += len(line) + 1
+        message = line[line.find(b']') + 1:].lstrip()
+        if LEVEL_PREFIX not in found and message.startswith(LEVEL_PREFIX):
+            found[LEVEL_PREFIX] = offset, line
+        elif ZONE_PREFIX not in found and message.startswith(ZONE_PREFIX) \
+                and not message.startswith(NOT_A_ZONE_PREFIX):
+            found[ZONE_PREFIX] = offset, line
+        elif ZONE_PREFIX not in found and LOCATION_PREFIX not in found \
+                and message.startswith(LOCATION_PREFIX):
+            # a location before the zone entry is in another zone
+            found[LOCATION_PREFIX] = offset, line
+        if ZONE_PREFIX in found and (
+                LEVEL_PREFIX in found or scanned > LEVEL_SCAN_LIMIT):
+            break
+
+    charmatch = LogFile.character_name_regex.search(path)
+    charname = sys.intern(charmatch.groups()[0] if charmatch else '')
+    timestamps = TimestampParser()
+    records = []
+    # by offset, lines logged in the same second stay in order
+    for offset, line in sorted(found.values()):
+        try:
+            timestamp, text = timestamps.parse(line.decode(LOG_ENCODING))
+        except ValueError:
+            continue
+        records.append(LogLine(timestamp, text, charname, offset))
+    return records
@@ -1,20 +1,18 @@
 
-import re
-from datetime import datetime, timedelta
-from helpers.logregex import AFK_ON_REGEX, AFK_OFF_REGEX
+from datetime import timedelta
 from pyprowl import Prowl
-from helpers import config
+from helpers import clock, config, triggers
 from helpers.win32 import getIdleTime
 
 
 class LogStreamer:
 
     def __init__(self):
-        self.trigger_cache = None
-        self.trigger_cache_hash = None
         self.is_afk = False
         self.camp_time = None
         self.character_name = None
+        self.zone = None
+        self._active_triggers = {}  # ScopedTriggers : TriggerSet in context
 
     def shouldPushTriggerNotifications(self):
         push_enabled = config.data['push']['push_enabled']
@@ -48,20 +46,42 @@ class LogStreamer:
 
     def isUserPlayingEQ(self):
         if self.camp_time:
-            return self.camp_time > datetime.now()
+            return self.camp_time > clock.now()
         else:
             return True
 
     def setCharacterName(self, charname):
-        self.character_name = charname
+        if charname != self.character_name:
+            self.character_name = charname
+            self._active_triggers = {}
+
+    def setAFK(self, afk):
+        if afk != self.is_afk:
+            self.is_afk = afk
+            self._active_triggers = {}
+
+    def setZone(self, zone):
+        if zone != self.zone:
+            self.zone = zone
+            self._active_triggers = {}
+
+    def activeTriggers(self, scoped_triggers):
+        """Returns the TriggerSet of scoped_triggers that can fire now."""
+        active = self._active_triggers.get(scoped_triggers)
+        if active is None:
+            active = scoped_triggers.active(
+                self.zone, self.is_afk, self.character_name)
+            self._active_triggers[scoped_triggers] = active
+        return active
+
+    def campStarted(self, timestamp):
+        self.camp_time = timestamp + timedelta(seconds=5)
+
+    def campStopped(self):
+        self.camp_time = None
 
     def getRegularExpressionTriggers(self):
-        cfg = tuple([tuple(trigger_list) for trigger_list in config.data['push']['triggers']])
-        cfghash = hash(cfg)
-        if self.trigger_cache_hash != cfghash:
-            self.trigger_cache_hash = cfghash
-            self._compileTriggers()
-        return self.trigger_cache
+        return triggers.current().triggers
 
     def _handleTimerExpiry(self, spell, target):
 
@@ -93,55 +113,29 @@ class LogStreamer:
         if self.camp_time and timestamp > self.camp_time + timedelta(seconds=1):
             self.camp_time = None
 
-        # Switch AFK on and off
-        if AFK_ON_REGEX.match(text):
-            self.is_afk = True
-            return
-        elif AFK_OFF_REGEX.match(text):
-            self.is_afk = False
-            return
-
         # Skip if we are not using push notifications
         if config.data['push']['push_enabled'] is False:
             return
 
-        # Detect when you are camped / in-game
-        if text[:20] == "Welcome to EverQuest":
-            self.camp_time = None
-        elif text[:54] == "It will take about 5 more seconds to prepare your camp":
-            self.camp_time = datetime.now() + timedelta(seconds=5)
-        elif text[:37] == "You abandon your preparations to camp":
-            self.camp_time = None
-
         # Detect triggers
-        for name, trigger in self.getRegularExpressionTriggers():
-            match = trigger.match(text)
-            if match:
-                if len(config.data['push']['prowl_api_key']) == 0:
-                    print("LogStreamer ERROR: No API key supplied")
-                    continue
-
-                if not self.shouldPushTriggerNotifications():
-                    continue
-
-                source = match.groupdict().get('source', None)
-                if source and self.character_name and source.strip().lower() in self.character_name:
-                    print("DEBUG: Skipping %s because source is player's character")
-                    continue
-
-                print("DEBUG: Sent %s notification: %s" % (name, text))
-                prowl = Prowl(config.data['push']['prowl_api_key'])
-                prowl.notify(
-                    event=name,
-                    description=text,
-                    priority=0,
-                    appName='EverQuest'
-                )
-
-    def _compileTriggers(self):
-        self.trigger_cache = []
-        for name, regex in config.data['push']['triggers']:
-            self.trigger_cache.append(
-                (name, re.compile(regex))
+        for name, match in self.activeTriggers(triggers.current()).matches(text):
+            if len(config.data['push']['prowl_api_key']) == 0:
+                print("LogStreamer ERROR: No API key supplied")
+                continue
+
+            if not self.shouldPushTriggerNotifications():
+                continue
+
+            source = match.groupdict().get('source', None)
+            if source and self.character_name and source.strip().lower() in self.character_name:
+                print("DEBUG: Skipping %s because source is player's character")
+                continue
+
+            print("DEBUG: Sent %s notification: %s" % (name, text))
+            prowl = Prowl(config.data['push']['prowl_api_key'])
+            prowl.notify(
+                event=name,
+                description=text,
+                priority=0,
+                appName='EverQuest'
             )
-
@@ -0,0 +1,285 @@
+"""
+Change notification backends for the log reader.
+
+Every backend emits file_changed(path) when a watched log is written and
+directory_changed(path) when logs are created or removed, and keeps track
+of how often it woke up and how long after a write it noticed the change.
+"""
+import os
+import sys
+import time
+import struct
+import ctypes
+import ctypes.util
+from collections import deque
+from fnmatch import fnmatch
+
+from PyQt5.QtCore import (QFileSystemWatcher, QObject, QSocketNotifier,
+                          QTimer, pyqtSignal)
+
+LOG_PATTERN = 'eqlog*.txt'
+WATCHERS = ('auto', 'qt', 'inotify', 'polling')
+
+
+class LogWatcher(QObject):
+    """Base class for change notification backends."""
+
+    name = ''
+    file_changed = pyqtSignal(str)
+    directory_changed = pyqtSignal(str)
+
+    def __init__(self, directory, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self._files = set()
+        self._wakeups = deque()  # times of wakeups within the last minute
+        self._latencies = deque(maxlen=100)  # seconds, most recent changes
+
+    def add_paths(self, paths):
+        self._files.update(paths)
+
+    def files(self):
+        return list(self._files)
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        self._prune_wakeups(time.time())
+        if self._latencies:
+            average = sum(self._latencies) / len(self._latencies) * 1000
+            maximum = max(self._latencies) * 1000
+        else:
+            average, maximum = 0, 0
+        return [
+            ('Watcher', self.name),
+            ('Wakeups / min', len(self._wakeups)),
+            ('Detection Latency', '{:.0f} msec avg, {:.0f} msec max'.format(
+                average, maximum)),
+        ]
+
+    def _wakeup(self):
+        now = time.time()
+        self._wakeups.append(now)
+        self._prune_wakeups(now)
+
+    def _prune_wakeups(self, now):
+        while self._wakeups and self._wakeups[0] < now - 60:
+            self._wakeups.popleft()
+
+    def _file_changed(self, path):
+        try:
+            latency = time.time() - os.stat(path).st_mtime
+        except OSError:
+            pass
+        else:
+            self._latencies.append(max(0, latency))
+        self.file_changed.emit(path)
+
+    def _directory_changed(self):
+        self.directory_changed.emit(self.directory)
+
+
+class QtLogWatcher(LogWatcher):
+    """QFileSystemWatcher, the default outside of Linux."""
+
+    name = 'qt'
+
+    def __init__(self, directory, parent=None):
+        super().__init__(directory, parent)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.addPath(directory)
+        self._watcher.fileChanged.connect(self._qt_file_changed)
+        self._watcher.directoryChanged.connect(self._qt_directory_changed)
+
+    def add_paths(self, paths):
+        if paths:
+            self._watcher.addPaths(paths)
+
+    def files(self):
+        return self._watcher.files()
+
+    def stop(self):
+        self._watcher.fileChanged.disconnect(self._qt_file_changed)
+        self._watcher.directoryChanged.disconnect(self._qt_directory_changed)
+
+    def _qt_file_changed(self, path):
+        self._wakeup()
+        # Qt stops watching a file that was replaced or removed, while it
+        # may still list it, so watch whatever is at the path now
+        self._watcher.removePath(path)
+        if os.path.exists(path):
+            self._watcher.addPath(path)
+        self._file_changed(path)
+
+    def _qt_directory_changed(self, _):
+        self._wakeup()
+        self._directory_changed()
+
+
+class InotifyLogWatcher(LogWatcher):
+    """
+    Linux inotify through ctypes.
+
+    Watches the directory rather than each file so replaced logs keep being
+    watched.
+    """
+
+    name = 'inotify'
+
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct('iIII')
+
+    _libc = None
+
+    @classmethod
+    def available(cls):
+        if not sys.platform.startswith('linux'):
+            return False
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(
+                    ctypes.util.find_library('c') or 'libc.so.6',
+                    use_errno=True)
+                libc.inotify_init1
+                libc.inotify_add_watch
+            except (OSError, AttributeError):
+                return False
+            cls._libc = libc
+        return True
+
+    def __init__(self, directory, parent=None):
+        super().__init__(directory, parent)
+        if not self.available():
+            raise OSError('inotify is not available')
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = self.IN_MODIFY | self.IN_MOVED_FROM | self.IN_MOVED_TO | \
+            self.IN_CREATE | self.IN_DELETE
+        if self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+        self._notifier = QSocketNotifier(self._fd, QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self._read_events)
+
+    def stop(self):
+        self._notifier.setEnabled(False)
+        os.close(self._fd)
+
+    def _read_events(self, _):
+        self._wakeup()
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        changed, directory_changed = [], False
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = self.EVENT.unpack_from(buffer, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(buffer[offset:offset + length].split(b'\0', 1)[0])
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                directory_changed = True
+                changed = list(self._files)
+                continue
+            if not fnmatch(name, LOG_PATTERN):
+                continue
+            path = os.path.join(self.directory, name)
+            if mask & self.IN_MODIFY:
+                if path not in changed:
+                    changed.append(path)
+            else:
+                if mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    # a log created again under this name is new
+                    self._files.discard(path)
+                directory_changed = True
+        if directory_changed:
+            self._directory_changed()
+        for path in changed:
+            self._file_changed(path)
+
+
+class PollingLogWatcher(LogWatcher):
+    """
+    Polls the logs with stat().
+
+    Polls quickly while logs are being written and backs off while idle,
+    for filesystems that do not deliver notifications.
+    """
+
+    name = 'polling'
+    MIN_INTERVAL = 50  # msec
+    MAX_INTERVAL = 2000  # msec
+
+    def __init__(self, directory, parent=None):
+        super().__init__(directory, parent)
+        self._file_stats = {}  # path : (size, mtime, inode)
+        self._directory_stat = self._stat(directory)
+        self._interval = self.MIN_INTERVAL
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._poll)
+        self._timer.start(self._interval)
+
+    def add_paths(self, paths):
+        super().add_paths(paths)
+        for path in paths:
+            self._file_stats[path] = self._stat(path)
+
+    def stop(self):
+        self._timer.stop()
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def _poll(self):
+        self._wakeup()
+        activity = False
+        directory_stat = self._stat(self.directory)
+        if directory_stat != self._directory_stat:
+            self._directory_stat = directory_stat
+            activity = True
+            self._directory_changed()
+        for path in list(self._files):
+            file_stat = self._stat(path)
+            if file_stat is None:
+                self._files.discard(path)
+                self._file_stats.pop(path, None)
+            elif file_stat != self._file_stats.get(path):
+                self._file_stats[path] = file_stat
+                activity = True
+                self._file_changed(path)
+        if activity:
+            self._interval = self.MIN_INTERVAL
+        else:
+            self._interval = min(self._interval * 2, self.MAX_INTERVAL)
+        self._timer.start(self._interval)
+
+
+def create_watcher(kind, directory, parent=None):
+    """Returns the LogWatcher for kind, one of WATCHERS."""
+    if kind == 'qt':
+        return QtLogWatcher(directory, parent)
+    if kind == 'polling':
+        return PollingLogWatcher(directory, parent)
+    if kind == 'inotify' or (kind == 'auto' and sys.platform.startswith('linux')):
+        try:
+            return InotifyLogWatcher(directory, parent)
+        except OSError:
+            return PollingLogWatcher(directory, parent)
+    return QtLogWatcher(directory, parent)
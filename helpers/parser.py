@@ -1,12 +1,15 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import (QFrame, QHBoxLayout, QLabel,
                              QPushButton, QVBoxLayout, QWidget)
 
-from helpers import config
+from helpers import characters, config, events
+from helpers.router import LineRouter
 
 
 class ParserWindow(QFrame):
 
+    line_filter_changed = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.name = ''
@@ -80,10 +83,12 @@ class ParserWindow(QFrame):
             self.show()
             config.data[self.name]['toggled'] = True
         config.save()
+        self.line_filter_changed.emit()
 
     def closeEvent(self, _):
         config.data[self.name]['toggled'] = False
         config.save()
+        self.line_filter_changed.emit()
 
     def enterEvent(self, event):
         self._menu.setVisible(True)
@@ -95,3 +100,60 @@ class ParserWindow(QFrame):
 
     def settings_updated(self):
         pass
+
+    def routes(self):
+        """
+        Returns [(event type, handler)] for LineRouter, handler is called
+        with each helpers.events event of that type.  By default every line
+        is sent to parse().
+        """
+        return [(events.Line, self._parse_line_event)]
+
+    def dispatch_routes(self):
+        """
+        Returns the routes to dispatch lines with, routes() unless a plugin
+        extended parse() through plugins.ClassExtension, then every line
+        goes to parse() so the extension sees it.
+        """
+        if self.extended_parse():
+            return [(events.Line, self._parse_line_event)]
+        return self.routes()
+
+    def extended_parse(self):
+        """Returns True when a plugin extended parse() of this class."""
+        extension = getattr(type(self), '__extension__', None)
+        # the original parse() stays first in the chain once extended
+        return extension is not None and \
+            len(extension.impl.get('parse', ())) > 1
+
+    def _parse_line_event(self, line):
+        self.parse(line.timestamp, line.text, line.charname)
+
+    def parse(self, timestamp, text, charname):
+        pass
+
+    def parse_batch(self, lines):
+        """
+        Parses a list of helpers.logline.LogLine at once.  Each line is sent
+        through routes(), then batch_parsed() is called once.
+        """
+        if lines:
+            characters.seen(lines[0].charname)
+        LineRouter(characters.routes() + self.routes()).route_lines(lines)
+        self.batch_parsed()
+
+    def batch_parsed(self):
+        """
+        Called after every batch of lines, to apply once what the handlers
+        deferred, like repainting.
+        """
+        pass
+
+    def line_filter(self):
+        """
+        Returns the lines the routes need as a dict of 'prefixes', 'literals'
+        and 'windows' ({prefix: seconds}) for LineFilter, or None for every
+        line.  Emit line_filter_changed when this or routes() changes.
+        """
+        return events.line_filter(
+            event_type for event_type, _ in self.routes())
@@ -0,0 +1,156 @@
+"""
+Runs a plugin in a child process of its own.
+
+Plugins named in general:isolated_plugins are not imported into nParse.
+PluginHost starts a child process that loads the plugin with a
+PluginManager of its own, so subscriptions and parse_batch work as usual
+but run on another core.  Batches of lines are sent over a bounded queue
+and dropped when the child falls behind, so a slow plugin never blocks the
+parsers.  Requests for the interface and the hook profile come back over a
+second queue, and a plugin that crashes its process is unloaded.
+"""
+import time
+import queue
+import multiprocessing
+
+from PyQt5.QtCore import QObject, QTimer
+
+from helpers import config
+
+QUEUE_BATCHES = 100  # batches waiting for the child before dropping
+POLL_INTERVAL = 100  # msec between checks for requests from the child
+STOP_TIMEOUT = 2  # seconds the child gets to unload before it is killed
+PROFILE_INTERVAL = 1  # seconds between hook profiles sent by the child
+
+
+class PluginHost(QObject):
+    """The child process running the plugin of a MetaPlugin."""
+
+    def __init__(self, plugin):
+        super().__init__()
+        self._plugin = plugin
+        context = multiprocessing.get_context('spawn')
+        self._lines = context.Queue(QUEUE_BATCHES)
+        self._requests = context.Queue()
+        self._process = context.Process(
+            target=_host_main,
+            args=(plugin.path, config._filename, self._lines, self._requests),
+            name='nparse-plugin-{}'.format(plugin.name()),
+            daemon=True)
+        self.line_filter = None  # every line until the child says otherwise
+        self.dropped = 0  # lines not sent because the queue was full
+        self._stopping = False
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._poll)
+
+    def start(self):
+        self._process.start()
+        self._timer.start(POLL_INTERVAL)
+
+    def stop(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        self._timer.stop()
+        try:
+            self._lines.put(None, timeout=STOP_TIMEOUT)
+        except queue.Full:
+            pass
+        self._process.join(STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._drain()  # the last profile
+        self._lines.close()
+        self._requests.close()
+
+    def send_lines(self, lines):
+        """Queues LogLine records for the plugin, dropped if it is behind."""
+        try:
+            self._lines.put_nowait([
+                (line.timestamp, line.text, line.charname, line.offset)
+                for line in lines])
+        except queue.Full:
+            self.dropped += len(lines)
+
+    def _poll(self):
+        self._drain()
+        if not self._process.is_alive() and not self._stopping:
+            print("[Plugin] Plugin \"%s\" unloaded because its process exited with code %s" % (self._plugin.name(), self._process.exitcode))
+            self._plugin.unload()
+
+    def _drain(self):
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            self._handle(*request)
+
+    def _handle(self, name, *kargs):
+        app = self._plugin.manager.app
+        if self._stopping and name != 'profile':
+            return  # unloading already
+        if name == 'profile':
+            self._plugin.profiles = kargs[0]  # hook name : HookProfile
+        elif name == 'line_filter':
+            self.line_filter = kargs[0]
+            if hasattr(app, '_update_routes'):
+                app._update_routes()
+        elif name == 'show_message':
+            if hasattr(app, 'show_message'):
+                app.show_message(*kargs)
+        elif name == 'unloaded':
+            print("[Plugin] Plugin \"%s\" unloaded in its process." % self._plugin.name())
+            self._plugin.unload()
+
+
+class HostApp:
+    """Stands in for the application in the child process."""
+
+    def __init__(self, requests):
+        self._requests = requests
+
+    def show_message(self, title, message, msecs=3000):
+        """Shows a tray notification."""
+        self._requests.put(('show_message', title, message, msecs))
+
+
+def _host_main(path, config_filename, lines, requests):
+    # imported here, the child has no PluginManager of nParse to share
+    from plugins import MetaPlugin, PluginManager
+    from helpers.logline import LogLine
+    from helpers.router import LineRouter
+
+    config.load(config_filename)
+    config.verify_settings()
+    manager = PluginManager(HostApp(requests))
+    plugin = MetaPlugin(path, manager, hosted=True)
+    manager.plugins.add(plugin)
+    plugin.load()
+    manager.update_subscriptions()
+    router = LineRouter(manager.routes())
+    requests.put(('line_filter', None if manager.implements('parse_batch')
+                  else manager.line_filter()))
+
+    reported, changed = time.perf_counter(), False
+    while plugin.is_ready():
+        try:
+            records = lines.get(timeout=PROFILE_INTERVAL)
+        except queue.Empty:
+            records = []
+        if records is None:
+            plugin.unload()
+            requests.put(('profile', plugin.profiles))
+            return
+        if records:
+            batch = [LogLine(*record) for record in records]
+            router.route_lines(batch)
+            manager.hook('parse_batch', batch)
+            changed = True
+        # the hook timings, for the Profile menu of nParse
+        if changed and time.perf_counter() - reported >= PROFILE_INTERVAL:
+            requests.put(('profile', plugin.profiles))
+            reported, changed = time.perf_counter(), False
+    requests.put(('profile', plugin.profiles))
+    requests.put(('unloaded',))
@@ -0,0 +1,123 @@
+import sys
+import time
+import datetime
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from helpers import TimestampParser, clock
+from helpers.logline import LogLine
+from helpers.logreader import LOG_ENCODING, LogFile
+
+
+class LogReplayer(QObject):
+    """
+    Plays an existing eqlog file back through the parsers.
+
+    Lines are emitted through new_lines in the same batches as LogReader.
+    A VirtualClock is installed and advanced to each line's timestamp
+    before it is emitted, so every timer runs on log time.  speed is a
+    multiple of real time, or 0 to replay as fast as possible.
+    """
+
+    new_lines = pyqtSignal(object)
+    finished = pyqtSignal(object)  # {'lines', 'seconds', 'log_seconds'}
+
+    TICK = 50  # msec
+    LINES_PER_TICK = 2000  # at maximum speed, then let the ui catch up
+
+    def __init__(self, path, speed=0):
+        super().__init__()
+        self._speed = speed
+        charmatch = LogFile.character_name_regex.search(path)
+        self._charname = sys.intern(
+            charmatch.groups()[0] if charmatch else '')
+        self._file = open(path, 'rb')
+        self._offset = 0  # of the next line in the file
+        self._timestamps = TimestampParser()
+        self._next = self._read()
+        self._clock = None
+        self._previous_clock = None  # installed before the replay
+        self._first = None  # timestamp of the first line
+        self._position = None  # log time reached when replaying at speed
+        self._lines = 0
+        self._started = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        if self._next is None:
+            self._finish()
+            return
+        self._first = self._position = self._next.timestamp
+        self._clock = clock.VirtualClock(self._first)
+        self._previous_clock = clock.install(self._clock)
+        self._started = time.perf_counter()
+        self._timer.start(0)
+
+    def stop(self):
+        self._timer.stop()
+        self._file.close()
+        if self._previous_clock is not None:
+            # back to live time, with the timers replayed lines started
+            self._clock.hand_over(self._previous_clock)
+            clock.install(self._previous_clock)
+            self._previous_clock = None
+
+    def _read(self):
+        """Returns the next LogLine or None at the end of the log."""
+        for line in self._file:
+            offset = self._offset
+            self._offset += len(line)
+            try:
+                timestamp, text = self._timestamps.parse(
+                    line.decode(LOG_ENCODING))
+            except ValueError:
+                continue
+            return LogLine(timestamp, text, self._charname, offset)
+        return None
+
+    def _tick(self):
+        if self._speed:
+            self._position += datetime.timedelta(
+                milliseconds=self.TICK * self._speed)
+        lines = 0
+        batch = []
+        while self._next is not None:
+            timestamp = self._next.timestamp
+            if self._speed and timestamp > self._position:
+                break
+            # lines sharing a timestamp go out together after the clock moves
+            if batch and batch[0].timestamp != timestamp:
+                self._emit(batch)
+                batch = []
+                if not self._speed and lines >= self.LINES_PER_TICK:
+                    break
+            batch.append(self._next)
+            lines += 1
+            self._next = self._read()
+        if batch:
+            self._emit(batch)
+
+        if self._next is None:
+            self._finish()
+            return
+        if self._speed:
+            self._clock.advance(self._position)
+        self._timer.start(self.TICK if self._speed else 0)
+
+    def _emit(self, batch):
+        self._clock.advance(batch[0].timestamp)
+        self._lines += len(batch)
+        self.new_lines.emit(batch)
+
+    def _finish(self):
+        self.stop()
+        seconds = time.perf_counter() - self._started if self._started else 0
+        log_seconds = (self._clock.now() - self._first).total_seconds() \
+            if self._clock else 0
+        self.finished.emit({
+            'lines': self._lines,
+            'seconds': seconds,
+            'log_seconds': log_seconds,
+        })
@@ -0,0 +1,54 @@
+"""
+Dispatches log lines to the parser handlers interested in them.
+
+Each line is classified once into a typed event (see helpers.events) and
+handed only to the handlers subscribed to that event type.  Handlers of
+events.Line see every line first.
+"""
+import time
+
+from helpers import events
+
+
+class LineRouter:
+    """Handlers by event type, fed with classified lines."""
+
+    def __init__(self, routes=()):
+        self.lines = 0
+        self.seconds = 0.0  # spent classifying and in handlers
+        self.set_routes(routes)
+
+    def set_routes(self, routes):
+        """Replaces every route with [(event type, handler)]."""
+        self._every = []  # handlers of events.Line
+        self._handlers = {}  # event type : [handler]
+        for event_type, handler in routes:
+            if event_type is events.Line:
+                self._every.append(handler)
+            else:
+                self._handlers.setdefault(event_type, []).append(handler)
+
+    def route(self, line):
+        """Sends a LogLine to its handlers."""
+        if self._every:
+            event = events.Line(line)
+            for handler in self._every:
+                handler(event)
+        if self._handlers:
+            event = events.classify(line, self._handlers)
+            if event is not None:
+                for handler in self._handlers.get(type(event), ()):
+                    handler(event)
+
+    def route_lines(self, lines):
+        """Routes LogLine records and keeps the time spent."""
+        started = time.perf_counter()
+        route = self.route
+        for line in lines:
+            route(line)
+        self.seconds += time.perf_counter() - started
+        self.lines += len(lines)
+
+    def stats(self):
+        rate = self.lines / self.seconds if self.seconds else 0
+        return [('Parse Rate', '{:,.0f} lines / sec'.format(rate))]
@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import (QCheckBox, QDialog, QFormLayout, QFrame,
 from PyQt5.QtCore import Qt
 
 from helpers import config, text_time_to_seconds
+from helpers.triggers import make_scope
 
 from parsers.spells import CustomTrigger
 from helpers.logregex import DEFAULT_PUSH_REGEXES
@@ -152,6 +153,37 @@ class SettingsWindow(QDialog):
         gsl_scaling.setSuffix('%')
         gsl_scaling.setObjectName('general:qt_scale_factor')
         gsl.addRow('Window Scaling Factor', gsl_scaling)
+        gsl.addRow(SettingsHeader('log reader'))
+        gsl_batch_size = QSpinBox()
+        gsl_batch_size.setRange(1, 5000)
+        gsl_batch_size.setSingleStep(50)
+        gsl_batch_size.setObjectName('general:log_batch_size')
+        gsl.addRow('Lines Per Batch', gsl_batch_size)
+        gsl_flush_latency = QSpinBox()
+        gsl_flush_latency.setRange(0, 1000)
+        gsl_flush_latency.setSingleStep(10)
+        gsl_flush_latency.setSuffix(' msec')
+        gsl_flush_latency.setObjectName('general:log_flush_latency')
+        gsl.addRow('Batch Flush Latency', gsl_flush_latency)
+        gsl_catchup_minutes = QSpinBox()
+        gsl_catchup_minutes.setRange(0, 1440)
+        gsl_catchup_minutes.setSuffix(' min')
+        gsl_catchup_minutes.setObjectName('general:catchup_minutes')
+        gsl.addRow('Catch Up On Start (0 to disable)', gsl_catchup_minutes)
+        gsl_catchup_max_mb = QSpinBox()
+        gsl_catchup_max_mb.setRange(0, 50)
+        gsl_catchup_max_mb.setSuffix(' MB')
+        gsl_catchup_max_mb.setObjectName('general:catchup_max_mb')
+        gsl.addRow('Catch Up Size Limit', gsl_catchup_max_mb)
+        gsl_queue_limit = QSpinBox()
+        gsl_queue_limit.setRange(0, 100000)
+        gsl_queue_limit.setSingleStep(1000)
+        gsl_queue_limit.setSuffix(' lines')
+        gsl_queue_limit.setObjectName('general:log_queue_limit')
+        gsl.addRow('Shed Spam Past (0 to disable)', gsl_queue_limit)
+        gsl_prefilter = QCheckBox()
+        gsl_prefilter.setObjectName('general:log_prefilter')
+        gsl.addRow('Skip Lines No Parser Uses', gsl_prefilter)
         gsl.addRow(SettingsHeader('experimental'))
         gsl_enable_plugins = QCheckBox()
         gsl_enable_plugins.setObjectName('general:enable_plugins')
@@ -159,6 +191,15 @@ class SettingsWindow(QDialog):
         gsl_safe_mode = QCheckBox()
         gsl_safe_mode.setObjectName('general:safe_mode')
         gsl.addRow('Safe Mode', gsl_safe_mode)
+        gsl_plugin_budget = QSpinBox()
+        gsl_plugin_budget.setRange(0, 5000)
+        gsl_plugin_budget.setSingleStep(10)
+        gsl_plugin_budget.setSuffix(' msec')
+        gsl_plugin_budget.setObjectName('general:plugin_budget')
+        gsl.addRow('Plugin Hook Budget (0 to disable)', gsl_plugin_budget)
+        gsl_plugin_budget_unload = QCheckBox()
+        gsl_plugin_budget_unload.setObjectName('general:plugin_budget_unload')
+        gsl.addRow('Unload Plugins Over Budget', gsl_plugin_budget_unload)
         general_settings.setLayout(gsl)
 
         stacked_widgets.append(('General', general_settings))
@@ -194,6 +235,9 @@ class SettingsWindow(QDialog):
         ssl_save_spells = QCheckBox()
         ssl_save_spells.setObjectName('spells:save_spells')
         ssl.addRow('Save Spells Between Sessions', ssl_save_spells)
+        ssl_track_others = QCheckBox()
+        ssl_track_others.setObjectName('spells:track_others')
+        ssl.addRow('Track Spells Cast By Others', ssl_track_others)
         spells_settings.setLayout(ssl)
         stacked_widgets.append(('Spells', spells_settings))
 
@@ -303,6 +347,33 @@ class SettingsHeader(QLabel):
         self.setAlignment(Qt.AlignCenter)
 
 
+class TriggerScope:
+    """Scope rows of a trigger dialog, see helpers.triggers.make_scope."""
+
+    def __init__(self, layout):
+        layout.addRow(SettingsHeader('Only Fires'))
+        self._zones = QLineEdit()
+        self._zones.setPlaceholderText('any zone')
+        layout.addRow('In Zones', self._zones)
+        self._characters = QLineEdit()
+        self._characters.setPlaceholderText('any character')
+        layout.addRow('For Characters', self._characters)
+        self._afk = QCheckBox()
+        layout.addRow('While AFK', self._afk)
+        layout.addWidget(QLabel("Separate names with commas."))
+
+    def set(self, scope):
+        scope = scope or {}
+        self._zones.setText(', '.join(scope.get('zones', [])))
+        self._characters.setText(', '.join(scope.get('characters', [])))
+        self._afk.setChecked(scope.get('afk', False))
+
+    def get(self):
+        return make_scope(self._zones.text().split(','),
+                          self._characters.text().split(','),
+                          self._afk.isChecked())
+
+
 class CustomTriggerSettings(QDialog):
 
     def __init__(self):
@@ -365,6 +436,8 @@ class CustomTriggerSettings(QDialog):
         self._trigger_on_you.setChecked(False)
         trigger_layout.addRow('Pauses When Camped', self._trigger_on_you)
 
+        self._trigger_scope = TriggerScope(trigger_layout)
+
         layout.addItem(trigger_layout)
 
         layout.addWidget(QWidget(), 1)  # spacer
@@ -391,6 +464,7 @@ class CustomTriggerSettings(QDialog):
             self._trigger_text.setText(ct.text)
             self._trigger_time.setText(ct.time)
             self._trigger_on_you.setChecked(ct.on_you)
+            self._trigger_scope.set(ct.scope)
             self._current_trigger = self._triggers.currentText()
         else:
             self._current_trigger = None
@@ -443,6 +517,7 @@ class CustomTriggerSettings(QDialog):
                     ct.text = self._trigger_text.text()
                     ct.time = self._trigger_time.text()
                     ct.on_you = self._trigger_on_you.isChecked()
+                    ct.scope = self._trigger_scope.get()
                     self._custom_triggers[ct.name] = ct
                 elif self._current_trigger == '':
                     # new trigger
@@ -450,7 +525,8 @@ class CustomTriggerSettings(QDialog):
                         self._trigger_name.text(),
                         self._trigger_text.text(),
                         self._trigger_time.text(),
-                        False
+                        False,
+                        self._trigger_scope.get()
                     )
                     self._custom_triggers[ct.name] = ct
                 else:
@@ -459,6 +535,7 @@ class CustomTriggerSettings(QDialog):
                     ct.text = self._trigger_text.text()
                     ct.time = self._trigger_time.text()
                     ct.on_you = self._trigger_on_you.isChecked()
+                    ct.scope = self._trigger_scope.get()
                     self._custom_triggers[self._current_trigger] = ct
                 
                 # save and reload
@@ -480,6 +557,7 @@ class CustomTriggerSettings(QDialog):
             self._trigger_text.setText(self._custom_triggers[name].text)
             self._trigger_time.setText(self._custom_triggers[name].time)
             self._trigger_on_you.setChecked(self._custom_triggers[name].on_you)
+            self._trigger_scope.set(self._custom_triggers[name].scope)
         else:
             self._clear()
     
@@ -488,6 +566,7 @@ class CustomTriggerSettings(QDialog):
         self._trigger_text.clear()
         self._trigger_time.clear()
         self._trigger_on_you.setChecked(False)
+        self._trigger_scope.set(None)
 
     def _close(self, _):
         self._save_to_config()
@@ -551,6 +630,9 @@ class PushTriggerSettings(QDialog):
         trigger_layout.addRow('Pattern', self._trigger_text)
 
         trigger_layout.addWidget(QLabel("Supports Regular Expressions"))
+
+        self._trigger_scope = TriggerScope(trigger_layout)
+
         layout.addItem(trigger_layout)
         layout.addWidget(QWidget(), 1)  # spacer
 
@@ -575,13 +657,16 @@ class PushTriggerSettings(QDialog):
     def _load_from_config(self):
         self._triggers.clear()
         for item in config.data['push']['triggers']:
-            self._custom_triggers[item[0]] = item
+            # [name, pattern, scope]
+            self._custom_triggers[item[0]] = [
+                item[0], item[1], item[2] if len(item) > 2 else None]
             self._triggers.addItem(item[0])
 
         if self._custom_triggers:
             ct = self._custom_triggers[self._triggers.currentText()]
             self._trigger_name.setText(ct[0])
             self._trigger_text.setText(ct[1])
+            self._trigger_scope.set(ct[2])
             self._current_trigger = self._triggers.currentText()
         else:
             self._current_trigger = None
@@ -590,7 +675,7 @@ class PushTriggerSettings(QDialog):
     def _save_to_config(self):
         config.data['push']['triggers'] =\
             [
-                [x[0], x[1]] for x
+                [x[0], x[1]] + ([x[2]] if x[2] else []) for x
                 in sorted(self._custom_triggers.values(), key=lambda x: x[0])
                 if x[0] != ""
             ]
@@ -630,15 +715,18 @@ class PushTriggerSettings(QDialog):
                     ct = self._custom_triggers.pop(self._current_trigger)
                     ct[0] = self._trigger_name.text()
                     ct[1] = self._trigger_text.text()
+                    ct[2] = self._trigger_scope.get()
                     self._custom_triggers[ct[0]] = ct
                 elif self._current_trigger == '':
                     # new trigger
-                    self._custom_triggers[self._trigger_name.text()] = [self._trigger_name.text(), self._trigger_text.text()]
+                    self._custom_triggers[self._trigger_name.text()] = [
+                        self._trigger_name.text(), self._trigger_text.text(),
+                        self._trigger_scope.get()]
                 else:
                     # update
                     ct = self._custom_triggers[self._current_trigger]
-                    ct[0] = self._trigger_text.text()
-                    ct[1] = self._trigger_time.text()
+                    ct[1] = self._trigger_text.text()
+                    ct[2] = self._trigger_scope.get()
                     self._custom_triggers[self._current_trigger] = ct
 
                 # save and reload
@@ -658,12 +746,14 @@ class PushTriggerSettings(QDialog):
         if name != "":
             self._trigger_name.setText(self._custom_triggers[name][0])
             self._trigger_text.setText(self._custom_triggers[name][1])
+            self._trigger_scope.set(self._custom_triggers[name][2])
         else:
             self._clear()
 
     def _clear(self):
         self._trigger_name.clear()
         self._trigger_text.clear()
+        self._trigger_scope.set(None)
 
     def _close(self, _):
         self._save_to_config()
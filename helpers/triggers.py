@@ -0,0 +1,248 @@
+"""
+Push notification and custom timer triggers compiled into one set.
+
+Each trigger regex is reduced to the longest literal every match must
+contain.  A line is scanned once for all of those literals, and only the
+triggers whose literal was found (plus those without one) run their regex,
+so the cost per line stays flat as triggers are added.
+
+Triggers may also have a scope, the zones, characters and AFK state they
+fire in.  ScopedTriggers keeps a TriggerSet of the triggers in scope for
+each context, so lines are only checked against triggers that can fire.
+"""
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # before Python 3.11
+    import sre_parse
+    import sre_constants
+
+from helpers import config
+
+
+class TriggerSet:
+    """
+    Compiled [(name, regex)] triggers, name may be any object.  With
+    re.IGNORECASE in flags the literals are matched case insensitively.
+    """
+
+    def __init__(self, triggers, flags=0):
+        self._fold = bool(flags & re.IGNORECASE)
+        self.triggers = []  # [(name, compiled regex)]
+        self._unfiltered = []  # indexes of triggers without a literal
+        self._by_literal = {}  # literal : [(index, anchored)]
+        for name, regex in triggers:
+            try:
+                compiled = re.compile(regex, flags)
+            except re.error as e:
+                print("[Triggers] Skipping \"%s\": %s" % (regex, e))
+                continue
+            index = len(self.triggers)
+            self.triggers.append((name, compiled))
+            literal, anchored = required_literal(regex)
+            if literal:
+                if self._fold:
+                    literal = literal.lower()
+                self._by_literal.setdefault(literal, []).append(
+                    (index, anchored))
+            else:
+                self._unfiltered.append(index)
+
+        # every literal present is the longest at its position or inside one
+        literals = list(self._by_literal)
+        self._implied = {
+            literal: [inner for inner in literals if inner in literal]
+            for literal in literals
+        }
+        self._scan = re.compile(literal_pattern(literals)) \
+            if literals else None
+
+    def line_filter(self):
+        """Returns the LineFilter arguments for the triggers, or None."""
+        if self._unfiltered:
+            return None
+        prefixes, literals = [], []
+        for literal, triggers in self._by_literal.items():
+            # LineFilter prefixes are case sensitive, its literals are not
+            if not self._fold and all(anchored for _, anchored in triggers):
+                prefixes.append(literal)
+            else:
+                literals.append(literal)
+        return {'prefixes': prefixes, 'literals': literals}
+
+    def matches(self, text):
+        """Returns [(name, match)] of the triggers matching text, in order."""
+        candidates = list(self._unfiltered)
+        if self._scan is not None:
+            scanned = text.lower() if self._fold else text
+            found = set()
+            match = self._scan.search(scanned)
+            while match:
+                literal = match.group()
+                if literal not in found:
+                    found.update(self._implied[literal])
+                match = self._scan.search(scanned, match.start() + 1)
+            for literal in found:
+                for index, anchored in self._by_literal[literal]:
+                    if not anchored or scanned.startswith(literal):
+                        candidates.append(index)
+        results = []
+        for index in sorted(candidates):
+            name, regex = self.triggers[index]
+            match = regex.match(text)
+            if match:
+                results.append((name, match))
+        return results
+
+
+class ScopedTriggers:
+    """
+    [(name, regex, scope)] triggers, see make_scope() for scope.  Ask
+    active() for the TriggerSet of a context when the context changes.
+    """
+
+    def __init__(self, triggers, flags=0):
+        self._flags = flags
+        self._scoped = [(name, regex, scope)
+                        for name, regex, scope in triggers]
+        self._all = TriggerSet(
+            [(name, regex) for name, regex, _ in self._scoped], flags)
+        self._unscoped = not any(scope for _, _, scope in self._scoped)
+        self._active = {}  # (zone, afk, charname) : TriggerSet
+
+    @property
+    def triggers(self):
+        """Every compiled [(name, regex)], whatever its scope."""
+        return self._all.triggers
+
+    def line_filter(self):
+        return self._all.line_filter()
+
+    def active(self, zone, afk, charname):
+        """Returns the TriggerSet of the triggers that can fire in context."""
+        if self._unscoped:
+            return self._all
+        context = (zone.lower() if zone else None, afk,
+                   charname.lower() if charname else None)
+        active = self._active.get(context)
+        if active is None:
+            active = TriggerSet([
+                (name, regex) for name, regex, scope in self._scoped
+                if in_scope(scope, *context)], self._flags)
+            self._active[context] = active
+        return active
+
+
+def make_scope(zones=(), characters=(), afk=False):
+    """
+    Returns a trigger scope for config, or None when it fires anywhere.
+    Zones and characters are names, any of them matches, empty for all.
+    """
+    scope = {}
+    zones = [zone.strip().lower() for zone in zones if zone.strip()]
+    characters = [name.strip().lower() for name in characters
+                  if name.strip()]
+    if zones:
+        scope['zones'] = zones
+    if characters:
+        scope['characters'] = characters
+    if afk:
+        scope['afk'] = True
+    return scope or None
+
+
+def in_scope(scope, zone, afk, charname):
+    """Returns True when a trigger of scope fires in the lowercase context."""
+    if not scope:
+        return True
+    if scope.get('zones') and zone not in scope['zones']:
+        return False
+    if scope.get('characters') and charname not in scope['characters']:
+        return False
+    return afk or not scope.get('afk')
+
+
+def literal_pattern(literals):
+    """
+    Returns a regex matching the longest of literals at a position, shaped
+    as a trie so the regex engine never retries common prefixes.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}  # a literal ends here
+
+    def build(node):
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 \
+            else '(?:{})'.format('|'.join(branches))
+        return '(?:{})?'.format(pattern) if '' in node else pattern
+
+    return build(trie)
+
+
+def required_literal(regex):
+    """
+    Returns (literal, anchored) for the longest text every match of regex
+    contains, anchored when it starts the match, or (None, False).
+    """
+    try:
+        parsed = sre_parse.parse(regex)
+    except re.error:
+        return None, False
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    if state.flags & (re.IGNORECASE | re.VERBOSE):
+        return None, False
+    runs = []
+    _literal_runs(list(parsed), runs, at_start=True)
+    if not runs:
+        return None, False
+    return max(runs, key=lambda run: len(run[0]))
+
+
+def _literal_runs(items, runs, at_start):
+    """Appends the (text, anchored) literal runs every match goes through."""
+    run, anchored = [], at_start
+    for op, argument in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(argument))
+            continue
+        if run:
+            runs.append((''.join(run), anchored))
+            at_start = False
+        run, anchored = [], False
+        if op is sre_constants.AT and at_start and argument in (
+                sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING):
+            anchored = True
+            continue
+        # groups without a quantifier are always matched
+        if op is sre_constants.SUBPATTERN and \
+                not argument[1] & re.IGNORECASE:
+            _literal_runs(list(argument[-1]), runs, False)
+        at_start = False
+    if run:
+        runs.append((''.join(run), anchored))
+
+
+_trigger_set = None
+_source = None
+
+
+def current():
+    """Returns the ScopedTriggers for config.data['push']['triggers']."""
+    global _trigger_set, _source
+    # the settings dialogs replace the list when triggers are saved
+    triggers = config.data['push']['triggers']
+    if triggers is not _source:
+        _trigger_set = ScopedTriggers(
+            (item[0], item[1], item[2] if len(item) > 2 else None)
+            for item in triggers)
+        _source = triggers
+    return _trigger_set
@@ -1,6 +1,8 @@
 """NomnsParse: Parsing tools for Project 1999."""
 import os
 import sys
+import argparse
+import multiprocessing
 import webbrowser
 from plugins import PluginManager, Plugin
 
@@ -10,7 +12,9 @@ from PyQt5.QtWidgets import (QApplication, QFileDialog, QMenu, QMessageBox,
                              QSystemTrayIcon)
 
 import parsers
-from helpers import config, logreader, resource_path, get_version
+from helpers import (characters, config, events, logfilter, logreader,
+                     replay, resource_path, get_version)
+from helpers.router import LineRouter
 from helpers.settings import SettingsWindow
 
 config.load('nparse.config.json')
@@ -44,6 +48,8 @@ class NomnsParse(QApplication):
         # Updates
         self._toggled = False
         self._log_reader = None
+        self._replayer = None
+        self._router = LineRouter()
 
         # Load Parsers
         self._load_parsers()
@@ -72,18 +78,46 @@ class NomnsParse(QApplication):
 
         self.plugins.hook(Plugin.on_app_start, self)
 
+    def show_message(self, title, message, msecs=3000):
+        """Shows a tray notification, for plugins."""
+        self._system_tray.showMessage(title, message, msecs=msecs)
+
     def _load_parsers(self):
         self._parsers = [
             parsers.Maps(),
             parsers.Spells()
         ]
         for parser in self._parsers:
+            parser.line_filter_changed.connect(self._update_routes)
             self.plugins.hook(Plugin.on_parser_load, parser)
             if parser.name in config.data.keys() and 'geometry' in config.data[parser.name].keys():
                 g = config.data[parser.name]['geometry']
                 parser.setGeometry(g[0], g[1], g[2], g[3])
             if config.data[parser.name]['toggled']:
                 parser.toggle()
+        self._update_routes()
+
+    def replay(self, path, speed=0):
+        """
+        Plays an existing log back through the parsers on a virtual clock.
+
+        speed is a multiple of real time, 0 replays as fast as possible.
+        """
+        if self._toggled:
+            self._toggle()
+        if self._replayer:
+            self._replayer.stop()
+            self._replayer.deleteLater()
+        self._replayer = replay.LogReplayer(path, speed)
+        self._replayer.new_lines.connect(self._parse_lines)
+        self._replayer.finished.connect(self._replay_finished)
+        self._replayer.start()
+
+    def _replay_finished(self, stats):
+        message = 'Replayed {} lines ({:.0f} sec of log) in {:.1f} sec.'.format(
+            stats['lines'], stats['log_seconds'], stats['seconds'])
+        print('[Replay] %s' % message)
+        self._system_tray.showMessage('nParse Replay', message, msecs=3000)
 
     def _toggle(self):
         if not self._toggled:
@@ -95,21 +129,70 @@ class NomnsParse(QApplication):
 
             else:
                 self._log_reader = logreader.LogReader(
-                    config.data['general']['eq_log_dir'])
-                self._log_reader.new_line.connect(self._parse)
+                    config.data['general']['eq_log_dir'],
+                    batch_size=config.data['general']['log_batch_size'],
+                    flush_latency=config.data['general']['log_flush_latency'],
+                    catchup_minutes=config.data['general']['catchup_minutes'],
+                    catchup_max_mb=config.data['general']['catchup_max_mb'],
+                    watcher=config.data['general']['log_watcher'],
+                    line_filter=self._line_filter(),
+                    keep_filter=self._wanted_lines(),
+                    queue_limit=config.data['general']['log_queue_limit'],
+                    restore_state=True)
+                self._log_reader.new_lines.connect(self._parse_lines)
                 self._toggled = True
         else:
             if self._log_reader:
+                self._log_reader.stop()
                 self._log_reader.deleteLater()
                 self._log_reader = None
             self._toggled = False
 
-    def _parse(self, new_line):
-        if new_line:
-            timestamp, text, charname = new_line  # (datetime, text)
-            #  don't send parse to non toggled items, except maps.  always parse maps
-            for parser in [parser for parser in self._parsers if config.data[parser.name]['toggled'] or parser.name == 'maps']:
-                parser.parse(timestamp, text, charname)
+    def _line_filter(self):
+        """Returns the LineFilter for the lines the parsers need, or None."""
+        if not config.data['general']['log_prefilter'] or \
+                self.plugins.implements(Plugin.parse_batch):
+            return None  # plugins parsing lines see all of them
+        return self._wanted_lines()
+
+    def _wanted_lines(self):
+        """
+        Returns the LineFilter for the lines the parsers and plugins need,
+        or None when they need every line.
+        """
+        return logfilter.LineFilter.combine(
+            [events.line_filter(
+                [event_type for event_type, _ in characters.routes()])] +
+            [None if parser.extended_parse() else parser.line_filter()
+             for parser in self._active_parsers()] +
+            [self.plugins.line_filter()])
+
+    def _active_parsers(self):
+        #  don't send parse to non toggled items, except maps.  always parse maps
+        return [parser for parser in self._parsers if config.data[parser.name]['toggled'] or parser.name == 'maps']
+
+    def _update_routes(self):
+        """
+        Rebuilds the routes and line filter from the active parsers and the
+        plugins' subscriptions.
+        """
+        self.plugins.update_subscriptions()
+        self._router.set_routes(
+            characters.routes() +
+            [route for parser in self._active_parsers()
+             for route in parser.dispatch_routes()] + self.plugins.routes())
+        if self._log_reader:
+            self._log_reader.set_filter(
+                self._line_filter(), self._wanted_lines())
+
+    def _parse_lines(self, new_lines):
+        if new_lines:
+            characters.seen(new_lines[0].charname)
+        self._router.route_lines(new_lines)
+        for parser in self._active_parsers():
+            parser.batch_parsed()
+        self.plugins.hook(Plugin.parse_batch, new_lines)
+        self.plugins.send_lines(new_lines)
 
     def _menu(self, event):
         """Returns a new QMenu for system tray."""
@@ -136,6 +219,10 @@ class NomnsParse(QApplication):
 
         menu.addSeparator()
         settings_action = menu.addAction('Settings')
+        if self._log_reader:
+            stats_menu = menu.addMenu('Statistics')
+            for label, value in self._log_reader.stats() + self._router.stats():
+                stats_menu.addAction('{}: {}'.format(label, value)).setEnabled(False)
 
         # Plugin support for adding menu items
         if self.plugins.has_plugins():
@@ -153,6 +240,7 @@ class NomnsParse(QApplication):
         # Plugin support for handling menu actions
         if plugin_options:
             plugin_options(action)
+            self._update_routes()
         self.plugins.hook(Plugin.on_menu_click, action)
         # End plugin support
 
@@ -180,6 +268,7 @@ class NomnsParse(QApplication):
             for parser in self._parsers:
                 if parser.name == "spells":
                     parser.load_custom_timers()
+            self._update_routes()
 
         elif action == quit_action:
             if self._toggled:
@@ -197,6 +286,7 @@ class NomnsParse(QApplication):
 
             # Plugin support
             self.plugins.hook(Plugin.on_app_quit, self)
+            self.plugins.stop_hosts()
 
             self.quit()
 
@@ -215,7 +305,22 @@ class NomnsParse(QApplication):
             return False
 
 
+def replay_speed(value):
+    """Parses --speed, a positive multiple of real time or 'max' for 0."""
+    if value == 'max':
+        return 0
+    try:
+        speed = float(value)
+    except ValueError:
+        speed = 0
+    if not speed > 0:
+        raise argparse.ArgumentTypeError(
+            'expected a positive number or "max", got "%s"' % value)
+    return speed
+
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # isolated plugins in frozen builds
     try:
         import ctypes
         APPID = 'nomns.nparse'
@@ -223,7 +328,16 @@ if __name__ == "__main__":
     except:
         pass
 
-    APP = NomnsParse(sys.argv)
+    ARG_PARSER = argparse.ArgumentParser(description='nParse')
+    ARG_PARSER.add_argument(
+        '--replay', metavar='EQLOG',
+        help='play an existing log file back instead of tailing the logs')
+    ARG_PARSER.add_argument(
+        '--speed', default='max', type=replay_speed,
+        help='replay speed as a multiple of real time, or "max" (default)')
+    ARGS, QT_ARGS = ARG_PARSER.parse_known_args()
+
+    APP = NomnsParse(sys.argv[:1] + QT_ARGS)
     APP.setStyleSheet(open(resource_path('data/ui/_.css')).read())
     APP.setWindowIcon(QIcon(resource_path('data/ui/icon.png')))
     APP.setQuitOnLastWindowClosed(False)
@@ -233,4 +347,7 @@ if __name__ == "__main__":
     QFontDatabase.addApplicationFont(
         resource_path('data/fonts/NotoSans-Bold.ttf'))
 
+    if ARGS.replay:
+        APP.replay(ARGS.replay, ARGS.speed)
+
     sys.exit(APP.exec())
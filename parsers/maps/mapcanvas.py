@@ -204,37 +204,47 @@ class MapCanvas(QGraphicsView):
             )
 
     def add_player(self, name, timestamp, location):
-        if name not in self._data.players.keys():
-            self._data.players[name] = Player(
-                name=name,
-                location=location,
-                timestamp=timestamp)
-            self._scene.addItem(self._data.players[name])
-        else:
-            self._data.players[name].previous_location = self._data.players[name].location
-            self._data.players[name].location = location
-            self._data.players[name].timestamp = timestamp
-        self._data.players[name].z_level = self._data.get_closest_z_group(
-            self._data.players[name].location.z
-        )
-
-        if name == '__you__' and config.data['maps']['use_z_layers']:
-            self._z_index = self._data.geometry.z_groups.index(
-                self._data.get_closest_z_group(
-                    self._data.players['__you__'].location.z
-                ))
+        self.add_players([(name, timestamp, location)])
+
+    def add_players(self, players):
+        """Moves [(name, timestamp, location)] and repaints once."""
+        for name, timestamp, location in players:
+            if name not in self._data.players.keys():
+                self._data.players[name] = Player(
+                    name=name,
+                    location=location,
+                    timestamp=timestamp)
+                self._scene.addItem(self._data.players[name])
+            else:
+                self._data.players[name].previous_location = self._data.players[name].location
+                self._data.players[name].location = location
+                self._data.players[name].timestamp = timestamp
+            self._data.players[name].z_level = self._data.get_closest_z_group(
+                self._data.players[name].location.z
+            )
+
+            if name == '__you__' and config.data['maps']['use_z_layers']:
+                self._z_index = self._data.geometry.z_groups.index(
+                    self._data.get_closest_z_group(
+                        self._data.players['__you__'].location.z
+                    ))
 
         self.update_()
 
-        if self._data.way_point and name == '__you__':
+        you = [location for name, _, location in players if name == '__you__']
+        if self._data.way_point and you:
             self._data.way_point.update_(
                 self.to_scale(),
-                location=location
+                location=you[-1]
             )
 
-        if name == '__you__' and config.data['maps']['auto_follow']:
+        if you and config.data['maps']['auto_follow']:
             self.center()
-    
+
+    def remove_player(self, name):
+        if self._data and name in self._data.players:
+            self._scene.removeItem(self._data.players.pop(name))
+
     def enterEvent(self, event):
         if config.data['maps']['show_mouse_location']:
             self._mouse_location.setVisible(True)
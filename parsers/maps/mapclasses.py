@@ -5,7 +5,7 @@ from PyQt5.QtGui import QPixmap, QPen
 from PyQt5.QtWidgets import (QGraphicsItemGroup, QGraphicsLineItem,
                              QGraphicsPixmapItem, QGraphicsTextItem)
 
-from helpers import format_time, get_degrees_from_line, to_eq_xy, to_real_xy
+from helpers import clock, format_time, get_degrees_from_line, to_eq_xy, to_real_xy
 
 
 class MouseLocation(QGraphicsTextItem):
@@ -84,6 +84,8 @@ class Player(QGraphicsItemGroup):
         self.addToGroup(self.directional)
         self.setZValue(10)
         self.z_level = 0
+        if self.name != '__you__':
+            self.setToolTip(self.name)
 
     def update_(self, scale):
         if self.previous_location:
@@ -125,7 +127,7 @@ class SpawnPoint(QGraphicsItemGroup):
 
     def _update(self):
         if self.timer:
-            remaining = self._end_time - datetime.datetime.now()
+            remaining = self._end_time - clock.now()
             remaining_seconds = remaining.total_seconds()
             if remaining_seconds < 0:
                 self.stop()
@@ -142,7 +144,7 @@ class SpawnPoint(QGraphicsItemGroup):
             self.realign()
 
             if remaining_seconds > 0 and self.timer:
-                self.timer.singleShot(1000, self._update)
+                clock.single_shot(1000, self._update)
 
     def realign(self, scale=None):
         if scale:
@@ -152,7 +154,7 @@ class SpawnPoint(QGraphicsItemGroup):
                          2 + self.pixmap.boundingRect().width() / 2, 15)
 
     def start(self, _=None, timestamp=None):
-        timestamp = timestamp if timestamp else datetime.datetime.now()
+        timestamp = timestamp if timestamp else clock.now()
         self._end_time = timestamp + datetime.timedelta(seconds=self.length)
         if self.timer:
             self._update()
@@ -2,7 +2,8 @@
 
 from PyQt5.QtWidgets import QHBoxLayout, QPushButton
 
-from helpers import config, to_real_xy, ParserWindow
+from helpers import characters, config, events, to_real_xy, ParserWindow
+from helpers.logline import LogLine
 
 from .mapcanvas import MapCanvas
 from .mapclasses import MapPoint
@@ -54,20 +55,60 @@ class Maps(ParserWindow):
 
         self.menu_area.addLayout(button_layout)
 
+        self._zones = {}  # charname : zone
+        self._locations = {}  # player : (timestamp, MapPoint) not drawn yet
+
         if config.data['maps']['last_zone']:
             self._map.load_map(config.data['maps']['last_zone'])
         else:
             self._map.load_map('west freeport')
 
+    def routes(self):
+        return [
+            (events.ZoneEntered, self._zone_entered),
+            (events.Location, self._location),
+        ]
+
     def parse(self, timestamp, text, charname):
-        if text[:23] == 'LOADING, PLEASE WAIT...':
-            pass
-        if text[:16] == 'You have entered':
-            self._map.load_map(text[17:-1])
-        if text[:16] == 'Your Location is':
-            x, y, z = [float(value) for value in text[17:].strip().split(',')]
-            x, y = to_real_xy(x, y)
-            self._map.add_player('__you__', timestamp, MapPoint(x=x, y=y, z=z))
+        self.parse_batch([LogLine(timestamp, text, charname)])
+
+    def batch_parsed(self):
+        self._draw_locations()
+
+    def _draw_locations(self):
+        """Draws the last location of each player and repaints once."""
+        if self._locations:
+            self._map.add_players([
+                (player, timestamp, location)
+                for player, (timestamp, location) in self._locations.items()])
+            self._locations = {}
+
+    def _player(self, charname):
+        """Returns the name charname is drawn under."""
+        return '__you__' if charname == characters.main() else charname
+
+    def _zone_entered(self, event):
+        self._draw_locations()  # on the map they were seen on
+        self._zones[event.charname] = event.zone.lower()
+        player = self._player(event.charname)
+        if player == '__you__':
+            self._map.load_map(event.zone)
+        else:
+            self._map.remove_player(player)
+
+    def _location(self, event):
+        player = self._player(event.charname)
+        if player != '__you__' and not self._in_main_zone(event.charname):
+            return
+        x, y = to_real_xy(event.x, event.y)
+        self._locations[player] = (
+            event.timestamp, MapPoint(x=x, y=y, z=event.z))
+
+    def _in_main_zone(self, charname):
+        """Boxed characters are only drawn while in the main character's zone."""
+        main_zone = self._zones.get(
+            characters.main(), config.data['maps']['last_zone'].lower())
+        return self._zones.get(charname) == main_zone
 
     # events
     def _toggle_show_poi(self, _):
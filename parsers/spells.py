@@ -3,18 +3,24 @@ import math
 import string
 import re
 import os
+import sys
 import json
 
 from copy import deepcopy
+from functools import partial
 
-from PyQt5.QtCore import QEvent, QObject, QRect, Qt, QTimer, pyqtSignal
+from PyQt5.QtCore import QEvent, QObject, QRect, Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import (QFrame, QHBoxLayout, QLabel, QProgressBar,
                              QScrollArea, QSpinBox, QVBoxLayout, QPushButton)
 
-from helpers import ParserWindow, config, format_time, text_time_to_seconds
+from helpers import (ParserWindow, characters, clock, config, events,
+                     format_time, text_time_to_seconds, triggers)
+from helpers.logline import LogLine
 from helpers.logstreamer import LogStreamer
 
+LOG_TIMESTAMP_RESOLUTION = 1000  # msec
+
 
 class Spells(ParserWindow):
     """Tracks spell casting, duration, and targets by name."""
@@ -22,7 +28,8 @@ class Spells(ParserWindow):
     def __init__(self):
         super().__init__()
         self.cvtrx = re.compile(r'ntimer ([A-Za-z0-9_]+?) (\d{6}) is not online at this time')
-        self.logstreamer = LogStreamer()
+        self._characters = {}  # charname : CharacterState
+        self._character = None  # CharacterState of the last line
 
         self.name = 'spells'
         self.setWindowTitle(self.name.title())
@@ -34,13 +41,19 @@ class Spells(ParserWindow):
         self.saved_spell_counter = 0
 
         self.spell_book = create_spell_book()
-        self._custom_timers = {}  # regex : CustomTimer
+        self._max_cast_time = max(
+            [spell.cast_time for spell in self.spell_book.values()] or [0])
+        self._landings = LandingIndex(self.spell_book)
+        self._worn_off = {}  # effect_text_worn_off : [Spell]
+        for spell in self.spell_book.values():
+            if spell.duration_formula != 0 and spell.effect_text_worn_off:
+                self._worn_off.setdefault(
+                    spell.effect_text_worn_off, []).append(spell)
+        self._custom_timers = None  # ScopedTriggers of CustomTrigger
         self.load_custom_timers()
         self._casting = None  # holds Spell when casting
-        self._zoning = None  # holds time of zone or None
         self._paused = None
         self._spell_triggers = []  # need a queue because of landing windows
-        self._spell_trigger = None
         self._update()
 
     def _setup_ui(self):
@@ -107,25 +120,50 @@ class Spells(ParserWindow):
             self.pause()
 
         self.updateCharacterSpellState()
-        QTimer.singleShot(1000, self._update)
+        clock.single_shot(1000, self._update)
+
+    @property
+    def logstreamer(self):
+        """LogStreamer of the main character."""
+        return self._get_character(self.character_name).logstreamer
+
+    def _get_character(self, charname):
+        # the readers intern charname, so a run of lines from one log
+        # is recognised without hashing or comparing the name
+        character = self._character
+        if character is not None and character.name is charname:
+            return character
+        character = self._characters.get(charname)
+        if character is None:
+            character = CharacterState(charname)
+            self._characters[charname] = character
+        self._character = character
+        return character
+
+    def _target_name(self, character, target):
+        """Spells landing on a boxed character are listed under its name."""
+        if target == '__you__' and character.name != self.character_name:
+            return character.name
+        return target
 
     def updateCharacterName(self, charname):
-        if not config.data['spells']['save_spells']:
-            return
-
-        fn = 'nparse_spelldat_%s.json' % charname
+        """Sets the main character, whose spells are shown as __you__."""
         if charname and self.character_name != charname:
-            serialized = {}
-            try:
-                # print("DEBUG: Loading spell save file for %s" % charname)
-                with open(fn, 'r') as fh:
-                    serialized = json.loads(fh.read()).get('spells', {})
-            except Exception:
-                pass
-            print("** Updating character from %s to %s" % (str(self.character_name), charname))
+            if config.data['spells']['save_spells']:
+                fn = 'nparse_spelldat_%s.json' % charname
+                serialized = {}
+                try:
+                    # print("DEBUG: Loading spell save file for %s" % charname)
+                    with open(fn, 'r') as fh:
+                        serialized = json.loads(fh.read()).get('spells', {})
+                except Exception:
+                    pass
+                print("** Updating character from %s to %s" % (str(self.character_name), charname))
+                self.character_name = charname
+                self.load_all(serialized)
             self.character_name = charname
-            self.load_all(serialized)
-        self.character_name = charname
+        if not config.data['spells']['save_spells']:
+            return
         target = self._spell_container.get_spell_target_by_name('__you__')
         if target and charname:
             target.setTargetVisibleName(charname)
@@ -152,23 +190,50 @@ class Spells(ParserWindow):
             except Exception:
                 pass
 
-    def _spell_triggered(self):
+    def _spell_triggered(self, character):
         """SpellTrigger spell_triggered event handler. """
-        if self._spell_trigger:
-            if self._spell_trigger.activated:
-                for target in self._spell_trigger.targets:
+        spell_trigger = character.spell_trigger
+        if spell_trigger:
+            if spell_trigger.activated:
+                for target in spell_trigger.targets:
                     self._spell_container.add_spell(
-                        self._spell_trigger.spell, target[0], target[1])
-        self._remove_spell_trigger()
+                        spell_trigger.spell, target[0],
+                        self._target_name(character, target[1]))
+        self._remove_spell_trigger(character)
+
+    def routes(self):
+        return [
+            (events.Line, self._parse_line),
+            (events.LoggedIn, self._logged_in),
+            (events.CastBegin, self._cast_begin),
+            (events.CastFailed, self._cast_failed),
+            (events.Zoning, self._zoning),
+            (events.ZoneEntered, self._zone_entered),
+            (events.LevelUp, self._level_up),
+            (events.SpellWornOff, self._spell_worn_off),
+            (events.Afk, self._afk),
+            (events.CampStart, self._camp_start),
+            (events.CampAbort, self._camp_abort),
+        ]
 
     def parse(self, timestamp, text, charname):
         """Parse casting triggers (casting, failure, success)."""
-        self.logstreamer.setCharacterName(charname)
-        self.logstreamer.stream(timestamp, text)
-        self.updateCharacterName(charname)
+        self.parse_batch([LogLine(timestamp, text, charname)])
+
+    def batch_parsed(self):
+        self._spell_container.sort()
+
+    def _parse_line(self, line):
+        """Push triggers, custom timers and landing of the current cast."""
+        timestamp, text = line.timestamp, line.text
+        character = self._get_character(line.charname)
+        character.logstreamer.stream(timestamp, text)
+        if characters.main() != self.character_name:
+            self.updateCharacterName(characters.main())
 
         # custom timers
         if config.data['spells']['use_custom_triggers']:
+            you = self._target_name(character, '__you__')
             cvt = self.cvtrx.match(text)
             if cvt and len(cvt.groups()) == 2:
                 name = cvt.groups()[0].replace("_", " ")
@@ -182,81 +247,148 @@ class Spells(ParserWindow):
                 )
                 self._spell_container.add_spell(spell, timestamp, '__custom__')
 
-            for rx, ct in self._custom_timers.items():
-                if rx.match(text):
-                    spell = Spell(
-                        name=ct.name,
-                        duration=int(text_time_to_seconds(ct.time)/6),
-                        duration_formula=11,  # honour duration ticks
-                        spell_icon=14
-                    )
-                    self._spell_container.add_spell(
-                        spell,
-                        timestamp,
-                        '__you__' if ct.on_you else '__custom__'
-                    )
-
-        if self._spell_trigger:
-            self._spell_trigger.parse(timestamp, text)
-
-        # Initial Spell Cast and trigger setup
-        if text[:17] == 'You begin casting':
-            spell = self.spell_book.get(text[18:-1], None)
-            if spell and spell.duration_formula != 0:
-                self._spell_triggered()  # in case we cut off the cast window, force trigger
-                self._remove_spell_trigger()
-
-                spell_trigger = SpellTrigger(
-                    spell=spell,
-                    timestamp=timestamp
+            custom_timers = character.logstreamer.activeTriggers(
+                self._custom_timers)
+            for ct, _ in custom_timers.matches(text):
+                spell = Spell(
+                    name=ct.name,
+                    duration=int(text_time_to_seconds(ct.time)/6),
+                    duration_formula=11,  # honour duration ticks
+                    spell_icon=14
                 )
-                spell_trigger.spell_triggered.connect(self._spell_triggered)
-                self._spell_trigger = spell_trigger
-
-        # Spell Interrupted
-        elif (self._spell_triggers and
-              text[:26] == 'Your spell is interrupted.' or
-              text[:20] == 'Your target resisted' or
-              text[:29] == 'Your spell did not take hold.' or
-              text[:26] == 'You try to cast a spell on'):
-            self._remove_spell_trigger()
-
-        # Elongate self buff timers by time zoning
-        elif text[:23] == 'LOADING, PLEASE WAIT...':
-            self._spell_triggered()
-            self._remove_spell_trigger()
-            self._zoning = timestamp
-            spell_target = self._spell_container.get_spell_target_by_name(
-                '__you__')
-            if spell_target:
-                for spell_widget in spell_target.spell_widgets():
-                    spell_widget.pause()
-        elif self._zoning and text[:16] == 'You have entered':
-            spell_target = self._spell_container.get_spell_target_by_name(
-                '__you__')
-            if spell_target:
-                for spell_widget in spell_target.spell_widgets():
-                    spell_widget.resume()
-
-    def _remove_spell_trigger(self):
-        if self._spell_trigger:
-            self._spell_trigger.stop()
-            self._spell_trigger.deleteLater()
-            self._spell_trigger = None
+                self._spell_container.add_spell(
+                    spell,
+                    timestamp,
+                    you if ct.on_you else '__custom__'
+                )
+
+        worn_off = self._worn_off.get(text)
+        if worn_off:
+            self._remove_spells(
+                [spell.name for spell in worn_off],
+                self._target_name(character, '__you__'))
+
+        spell_trigger = character.spell_trigger
+        if spell_trigger:
+            landed = len(spell_trigger.targets)
+            spell_trigger.parse(timestamp, text)
+            if len(spell_trigger.targets) != landed:
+                return  # our own cast
+
+        if config.data['spells']['track_others']:
+            self._track_landing(character, timestamp, text)
+
+    def _track_landing(self, character, timestamp, text):
+        """Times spells landing without a cast of our own."""
+        found = self._landings.find(text)
+        if found:
+            # shared landing texts go to the first spell of that line
+            spell, target = min(found, key=lambda landing: landing[0].id)
+            self._spell_container.add_spell(
+                spell, timestamp, self._target_name(character, target))
+
+    def _logged_in(self, event):
+        self._get_character(event.charname).logstreamer.campStopped()
+        self.updateCharacterName(characters.main())
+
+    def _cast_begin(self, event):
+        """Initial Spell Cast and trigger setup."""
+        character = self._get_character(event.charname)
+        spell = self.spell_book.get(event.spell_name, None)
+        if spell and spell.duration_formula != 0:
+            self._spell_triggered(character)  # in case we cut off the cast window, force trigger
+            self._remove_spell_trigger(character)
+
+            spell_trigger = SpellTrigger(
+                spell=spell,
+                timestamp=event.timestamp
+            )
+            spell_trigger.spell_triggered.connect(
+                partial(self._spell_triggered, character))
+            character.spell_trigger = spell_trigger
+
+    def _cast_failed(self, event):
+        self._remove_spell_trigger(self._get_character(event.charname))
+
+    def _zoning(self, event):
+        """Elongate self buff timers by time zoning."""
+        character = self._get_character(event.charname)
+        self._spell_triggered(character)
+        self._remove_spell_trigger(character)
+        character.zoning = event.timestamp
+        spell_target = self._spell_container.get_spell_target_by_name(
+            self._target_name(character, '__you__'))
+        if spell_target:
+            for spell_widget in spell_target.spell_widgets():
+                spell_widget.pause()
+
+    def _zone_entered(self, event):
+        character = self._get_character(event.charname)
+        character.logstreamer.setZone(event.zone)
+        if not character.zoning:
+            return
+        spell_target = self._spell_container.get_spell_target_by_name(
+            self._target_name(character, '__you__'))
+        if spell_target:
+            for spell_widget in spell_target.spell_widgets():
+                spell_widget.resume()
+
+    def _level_up(self, event):
+        """Keep durations in step with the main character's level."""
+        if event.charname == self.character_name:
+            self._level_widget.setValue(event.level)
+
+    def _spell_worn_off(self, event):
+        """Ends the timer of a spell we cast that wore off early."""
+        spell_widgets = self._spell_container.get_spell_widgets_by_name(
+            event.spell_name.lower())
+        for target in ('__you__', '__custom__'):
+            spell_widgets.pop(target, None)
+        if event.target:
+            spell_widget = spell_widgets.get(event.target)
+        elif spell_widgets:
+            # without a name the one closest to running out is assumed
+            spell_widget = min(spell_widgets.values(),
+                               key=lambda widget: widget.end_time)
+        else:
+            spell_widget = None
+        if spell_widget:
+            spell_widget._remove()
+
+    def _remove_spells(self, spell_names, target):
+        for spell_name in spell_names:
+            spell_widget = self._spell_container.get_spell_widgets_by_name(
+                spell_name).get(target)
+            if spell_widget:
+                spell_widget._remove()
+
+    def _afk(self, event):
+        self._get_character(event.charname).logstreamer.setAFK(event.afk)
+
+    def _camp_start(self, event):
+        self._get_character(event.charname).logstreamer.campStarted(
+            event.timestamp)
+
+    def _camp_abort(self, event):
+        self._get_character(event.charname).logstreamer.campStopped()
+
+    def _remove_spell_trigger(self, character):
+        if character.spell_trigger:
+            character.spell_trigger.stop()
+            character.spell_trigger.deleteLater()
+            character.spell_trigger = None
 
     def _level_change(self, _):
         config.data['spells']['level'] = self._level_widget.value()
         config.save()
 
     def load_custom_timers(self):
-        self._custom_timers = {}
-        for item in config.data['spells']['custom_timers']:
-            ct = CustomTrigger(*item)
-            rx = re.compile(
-                "^{}$".format(ct.text.replace('*', '.*')),
-                re.RegexFlag.IGNORECASE
-            )
-            self._custom_timers[rx] = ct
+        self._custom_timers = triggers.ScopedTriggers([
+            (ct, "^{}$".format(ct.text.replace('*', '.*')), ct.scope)
+            for ct in [CustomTrigger(*item)
+                       for item in config.data['spells']['custom_timers']]
+        ], re.RegexFlag.IGNORECASE)
+        self.line_filter_changed.emit()
 
     def _toggle_custom_timers(self, _):
         config.data['spells']['use_custom_triggers'] = \
@@ -267,17 +399,49 @@ class Spells(ParserWindow):
         config.data['push']['push_enabled'] = \
             self._push_toggle.isChecked()
         config.save()
-
-    def pause(self, timestamp=datetime.datetime.now()):
+        self.line_filter_changed.emit()
+
+    def line_filter(self):
+        # casts without a window, or by others, can land on any line
+        if not config.data['spells']['use_casting_window'] or \
+                config.data['spells']['track_others']:
+            return None
+        needed = events.line_filter(
+            event_type for event_type, _ in self.routes()
+            if event_type is not events.Line)
+        prefixes, literals = needed['prefixes'], needed['literals']
+        literals.extend(self._worn_off)
+        if config.data['push']['push_enabled']:
+            push = triggers.current().line_filter()
+            if push is None:
+                return None  # a trigger without a literal
+            prefixes.extend(push['prefixes'])
+            literals.extend(push['literals'])
+        if config.data['spells']['use_custom_triggers']:
+            prefixes.append('ntimer ')
+            custom = self._custom_timers.line_filter()
+            if custom is None:
+                return None  # a timer without any fixed text
+            literals.extend(custom['literals'])
+        window = (self._max_cast_time +
+                  config.data['spells']['casting_window_buffer'] +
+                  LOG_TIMESTAMP_RESOLUTION) / 1000
+        return {
+            'prefixes': prefixes,
+            'literals': literals,
+            'windows': {prefix: window for prefix in events.CastBegin.prefixes},
+        }
+
+    def pause(self, timestamp=None):
         if self._paused:
             return
         target = self._spell_container.get_spell_target_by_name('__you__')
         if target:
             for widget in target.spell_widgets():
                 widget.pause()
-        self._paused = timestamp
+        self._paused = timestamp or clock.now()
 
-    def resume(self, timestamp=datetime.datetime.now()):
+    def resume(self, timestamp=None):
         if not self._paused:
             return
         target = self._spell_container.get_spell_target_by_name('__you__')
@@ -287,7 +451,7 @@ class Spells(ParserWindow):
         self._paused = None
 
     def load_all(self, serialized):
-        ts = datetime.datetime.now()
+        ts = clock.now()
 
         # Remove all spells on __you__
         target = self._spell_container.get_spell_target_by_name('__you__')
@@ -314,6 +478,17 @@ class Spells(ParserWindow):
 
 
 
+class CharacterState:
+    """Parser state kept for each character whose log is being tailed."""
+
+    def __init__(self, name):
+        self.name = sys.intern(name) if name else name
+        self.logstreamer = LogStreamer()
+        self.logstreamer.setCharacterName(name)
+        self.spell_trigger = None  # SpellTrigger
+        self.zoning = None  # holds time of zone or None
+
+
 class SpellContainer(QFrame):
 
     def __init__(self):
@@ -322,39 +497,73 @@ class SpellContainer(QFrame):
         self.setObjectName('SpellContainer')
         self.layout().setContentsMargins(0, 0, 0, 0)
         self.layout().addStretch(1)
+        self._targets = {}  # target name : SpellTarget
+        self._spell_widgets = {}  # spell name : {target name : SpellWidget}
+        self._unsorted = set()  # target names added to since sort()
+        self._new_targets = False
 
     def add_spell(self, spell, timestamp, target='__you__'):
-        spell_target = None
-        new = False
-        for st in self.findChildren(SpellTarget):
-            if st.name == target:
-                spell_target = st
-        if not spell_target:
-            new = True
+        spell_target = self._targets.get(target)
+        new = spell_target is None
+        if new:
             spell_target = SpellTarget(target=target)
+            spell_target.removed.connect(
+                partial(self._target_removed, target, spell_target))
+            self._targets[target] = spell_target
             self.layout().addWidget(spell_target, 0)
 
-        spell_target.add_spell(spell, timestamp)
-
-        if new:
-            for x, widget in enumerate(sorted(self.findChildren(SpellTarget),
+        spell_widget = spell_target.add_spell(spell, timestamp)
+        spell_widgets = self._spell_widgets.setdefault(spell.name, {})
+        if spell_widgets.get(target) is not spell_widget:
+            spell_widgets[target] = spell_widget
+            spell_widget.removed.connect(partial(
+                self._spell_widget_removed, spell.name, target, spell_widget))
+
+        if not self._unsorted:
+            clock.single_shot(0, self.sort)  # unless a batch sorts first
+        self._unsorted.add(target)
+        self._new_targets = self._new_targets or new
+
+    def sort(self):
+        """Orders the targets and the spells added to since the last sort."""
+        for target in self._unsorted:
+            spell_target = self._targets.get(target)
+            if spell_target is not None:
+                spell_target.sort()
+        self._unsorted = set()
+        if self._new_targets:
+            self._new_targets = False
+            for x, widget in enumerate(sorted(self._targets.values(),
                                               key=lambda x: (int(x.target_label.property('TargetType')), x.name))):
                 self.layout().insertWidget(x, widget, 0)  # + 1 - skip target label
 
     def spell_targets(self):
         """Returns a list of all SpellTargets."""
-        return self.findChildren(SpellTarget)
+        return list(self._targets.values())
 
     def get_spell_target_by_name(self, name):
-        spell_targets = [
-            target for target in self.spell_targets() if target.name == name]
-        if spell_targets:
-            return spell_targets[0]
-        return None
+        return self._targets.get(name)
+
+    def get_spell_widgets_by_name(self, spell_name):
+        """Returns {target name: SpellWidget} of the spell called spell_name."""
+        return dict(self._spell_widgets.get(spell_name, {}))
+
+    def _target_removed(self, name, spell_target):
+        if self._targets.get(name) is spell_target:
+            del self._targets[name]
+
+    def _spell_widget_removed(self, spell_name, target, spell_widget):
+        spell_widgets = self._spell_widgets.get(spell_name, {})
+        if spell_widgets.get(target) is spell_widget:
+            del spell_widgets[target]
+            if not spell_widgets:
+                del self._spell_widgets[spell_name]
 
 
 class SpellTarget(QFrame):
 
+    removed = pyqtSignal()
+
     def __init__(self, target='__you__'):
         super().__init__()
         self.name = target
@@ -385,6 +594,9 @@ class SpellTarget(QFrame):
         self.target_label.setText('You (%s)' % name)
 
     def _remove(self, event=None):
+        for spell_widget in self.spell_widgets():
+            spell_widget.removed.emit()
+        self.removed.emit()
         self.setParent(None)
         self.deleteLater()
 
@@ -400,15 +612,22 @@ class SpellTarget(QFrame):
         event.accept()
 
     def add_spell(self, spell, timestamp):
-        target_type = spell.type  # default incoming spell type
-        recast = False
+        """Adds or recasts spell, call sort() once done adding."""
+        spell_widget = None
         for sw in self.findChildren(SpellWidget):
-            target_type *= sw.spell.type
             if sw.spell.name == spell.name:
-                recast = True
+                spell_widget = sw
                 sw.recast(timestamp, spell)
-        if not recast:
-            self.layout().addWidget(SpellWidget(spell, timestamp))
+        if spell_widget is None:
+            spell_widget = SpellWidget(spell, timestamp)
+            self.layout().addWidget(spell_widget)
+        return spell_widget
+
+    def sort(self):
+        """Orders the spells by time left and colours the target."""
+        target_type = 1
+        for sw in self.findChildren(SpellWidget):
+            target_type *= sw.spell.type
         if self.name == '__you__' or self.name == '__custom__':
             self.target_label.setProperty('TargetType', 0)  # user
         elif not target_type:  # treat target like enemy
@@ -417,13 +636,15 @@ class SpellTarget(QFrame):
             self.target_label.setProperty('TargetType', 1)  # friendly
         self.target_label.setStyle(self.target_label.style())
 
-        now = datetime.datetime.now()
+        now = clock.now()
         for x, widget in enumerate(sorted(self.findChildren(SpellWidget), key=lambda x: (x.end_time - now))):
             self.layout().insertWidget(x + 1, widget)  # + 1 - skip target label
 
 
 class SpellWidget(QFrame):
 
+    removed = pyqtSignal()
+
     def __init__(self, spell, timestamp):
         super().__init__()
         self.setObjectName('SpellWidget')
@@ -435,7 +656,8 @@ class SpellWidget(QFrame):
         self._calculate(timestamp)
         self.setProperty('Warning', False)
         self._time_label.setProperty('Warning', False)
-        self._update()
+        # once added to its target, it may have already run out
+        clock.single_shot(0, self._update)
 
     def _calculate(self, timestamp):
         ticks = get_spell_duration(self.spell, config.data['spells']['level'])
@@ -490,7 +712,7 @@ class SpellWidget(QFrame):
 
     def _update(self):
         if self._active:
-            remaining = self.end_time - datetime.datetime.now()
+            remaining = self.end_time - clock.now()
             remaining_seconds = remaining.total_seconds()
             self.progress.setValue(remaining.seconds)
             self.progress.update()
@@ -505,26 +727,28 @@ class SpellWidget(QFrame):
                 if isinstance(spells, Spells) and isinstance(target, SpellTarget):
                     spells.logstreamer._handleTimerExpiry(self.spell, target.name)
                 self._remove()
+                return
             self._time_label.setText(format_time(remaining))
-        QTimer.singleShot(1000, self._update)
+        clock.single_shot(1000, self._update)
 
     def serialize_spell(self):
         spell = deepcopy(self.spell.__dict__)
-        spell['serialized_remaining_seconds'] = (self.end_time - datetime.datetime.now()).total_seconds()
+        spell['serialized_remaining_seconds'] = (self.end_time - clock.now()).total_seconds()
         return spell
 
     def pause(self):
         if self._remaining_seconds is None:
-            self._remaining_seconds = (self.end_time - datetime.datetime.now()).total_seconds()
+            self._remaining_seconds = (self.end_time - clock.now()).total_seconds()
         self._active = False
 
     def resume(self):
         if self._remaining_seconds:
-            self.end_time = datetime.datetime.now() + datetime.timedelta(seconds=self._remaining_seconds)
+            self.end_time = clock.now() + datetime.timedelta(seconds=self._remaining_seconds)
             self._remaining_seconds = None
         self._active = True
 
     def _remove(self):
+        self.removed.emit()
         self.setParent(None)
         self.deleteLater()
 
@@ -583,27 +807,35 @@ class SpellTrigger(QObject):
 
         self.targets = []  # [(timestamp, target)]
         self.activated = False
+        self._window = None  # (opens, closes) in log time
 
         # create casting trigger window
-        self._times_up_timer = QTimer()
-        self._times_up_timer.setSingleShot(True)
-        self._times_up_timer.timeout.connect(self._times_up)
-        self._activate_timer = QTimer()
-        self._activate_timer.setSingleShot(True)
-        self._activate_timer.timeout.connect(self._activate)
+        self._times_up_timer = clock.timer(self._times_up)
 
         if config.data['spells']['use_casting_window']:
-            #  just in case user set casting window buffer super low, create offset for more accuracy.
-            msec_offset = (datetime.datetime.now() -
-                           self.timestamp).total_seconds() * 1000
-            self._times_up_timer.start(
-                self.spell.cast_time + config.data['spells']['casting_window_buffer'] - msec_offset)
-            self._activate_timer.start(
-                self.spell.cast_time - config.data['spells']['casting_window_buffer'] - msec_offset)
+            # log timestamps only have second resolution, widen by a second
+            cast_time = datetime.timedelta(milliseconds=self.spell.cast_time)
+            buffer = datetime.timedelta(
+                milliseconds=config.data['spells']['casting_window_buffer'] +
+                LOG_TIMESTAMP_RESOLUTION)
+            self._window = (
+                self.timestamp + cast_time - buffer,
+                self.timestamp + cast_time + buffer
+            )
+            # parse() closes the window on log time, so lines arriving late
+            # still land.  The timer closes it when no later line comes, and
+            # runs from now over the whole widened window.
+            self._times_up_timer.start(int(
+                (self._window[1] - self.timestamp).total_seconds() * 1000))
         else:
             self.activated = True
 
     def parse(self, timestamp, text):
+        if self._window:
+            if timestamp > self._window[1]:
+                self._times_up()
+                return
+            self.activated = timestamp >= self._window[0]
         if self.activated:
             if self.spell.effect_text_you and text[:len(self.spell.effect_text_you)] == self.spell.effect_text_you:
                 # cast self
@@ -619,14 +851,62 @@ class SpellTrigger(QObject):
                 self.spell_triggered.emit()
 
     def _times_up(self):
+        self.stop()
+        self.activated = bool(self.targets)
         self.spell_triggered.emit()
 
-    def _activate(self):
-        self.activated = True
-
     def stop(self):
         self._times_up_timer.stop()
-        self._activate_timer.stop()
+
+
+class LandingIndex:
+    """
+    Spells with a duration by the text shown when they land.
+
+    effect_text_other follows the target's name and effect_text_you is the
+    whole line, both are kept in one trie of reversed text.  A line is
+    walked backwards once and only as far as some landing text still
+    matches.
+    """
+
+    def __init__(self, spell_book):
+        self._trie = {}
+        for spell in spell_book.values():
+            if spell.duration_formula == 0:
+                continue
+            if spell.effect_text_other:
+                self._add(spell.effect_text_other, (spell, False))
+            if spell.effect_text_you:
+                self._add(spell.effect_text_you, (spell, True))
+
+    def _add(self, text, landing):
+        node = self._trie
+        for char in reversed(text):
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(landing)
+
+    def find(self, text):
+        """
+        Returns [(spell, target)] for the longest landing text ending text,
+        target is '__you__' or the name the text follows.
+        """
+        found = []
+        node = self._trie
+        start = len(text)
+        for char in reversed(text):
+            node = node.get(char)
+            if node is None:
+                break
+            start -= 1
+            landings = node.get(None)
+            if not landings:
+                continue
+            target = text[:start].strip()
+            matches = [(spell, '__you__' if you else target)
+                       for spell, you in landings if bool(target) != you]
+            if matches:
+                found = matches
+        return found
 
 
 def create_spell_book():
@@ -729,10 +1009,14 @@ def get_spell_duration(spell, level):
 
 class CustomTrigger:
 
-    def __init__(self, name='', text='', time='', on_you=False, **kwargs):
+    def __init__(self, name='', text='', time='', on_you=False, scope=None,
+                 **kwargs):
         self.name, self.text, self.time, self.on_you = name, text, time, on_you
+        self.scope = scope  # see helpers.triggers.make_scope
 
     def to_list(self):
+        if self.scope:
+            return [self.name, self.text, self.time, self.on_you, self.scope]
         return [self.name, self.text, self.time, self.on_you]
     
     def __str__(self):
@@ -1,8 +1,33 @@
 
 import os
+import json
+import time
 import importlib
 import inspect
-from helpers import config
+from collections import deque
+from functools import partial
+
+from PyQt5.QtWidgets import QFileDialog
+
+from helpers import config, events
+from helpers.pluginhost import PluginHost
+from helpers.triggers import TriggerSet
+
+BUDGET_STRIKES = 5  # calls over budget within BUDGET_WINDOW to be unloaded
+BUDGET_WINDOW = 60  # seconds
+
+
+def subscribe(*patterns):
+    """
+    Decorates a Plugin method to be called for the lines it asks for.  A
+    helpers.events type calls it with each event of that type, a regex
+    with (events.Line, match) for each line it matches from the start.
+    """
+    def decorate(method):
+        method.__subscriptions__ = \
+            getattr(method, '__subscriptions__', ()) + patterns
+        return method
+    return decorate
 
 
 class Plugin:
@@ -30,14 +55,23 @@ class Plugin:
     def on_app_quit(self, app):
         pass
 
+    def parse_batch(self, lines):
+        """Called with each batch of helpers.logline.LogLine read."""
+        pass
+
 
 class MetaPlugin:
-    def __init__(self, path, manager, module=None):
+    def __init__(self, path, manager, module=None, hosted=False):
         self.path = path
         self.manager = manager
         self.module = module
+        self.hosted = hosted  # loaded in the process of a PluginHost
+        self.host = None  # PluginHost when isolated in a process
         self.enabled = False
         self.instances = set()
+        self.profiles = {}  # hook name : HookProfile
+        self.overruns = 0  # calls over budget since loaded
+        self._strikes = deque()  # times of calls over budget within the window
 
     def __hash__(self):
         return self.path.__hash__()
@@ -54,7 +88,12 @@ class MetaPlugin:
         return os.path.basename(os.path.dirname(self.path))
 
     def is_loaded(self):
-        return self.module is not None
+        return self.module is not None or self.host is not None
+
+    def is_isolated(self):
+        """Returns True when the plugin is to run in a process of its own."""
+        return not self.hosted and \
+            self.name() in config.data['general']['isolated_plugins']
 
     def is_enabled(self):
         return self.enabled
@@ -63,6 +102,13 @@ class MetaPlugin:
         return self.is_loaded() and self.is_enabled()
 
     def load(self):
+        if self.is_isolated():
+            self.host = PluginHost(self)
+            self.host.start()
+            self.enabled = True
+            self.manager.plugins_changed()
+            return
+
         module_name = self.package_name() + "." + self.name()
         spec = importlib.util.spec_from_file_location(module_name, self.path)
         module = importlib.util.module_from_spec(spec)
@@ -70,6 +116,8 @@ class MetaPlugin:
         self.module = module
         self.enabled = True
         self.instances = set()
+        self.overruns = 0
+        self._strikes = deque()
         found_instances = False
 
         for _, class_ in inspect.getmembers(module):
@@ -89,29 +137,53 @@ class MetaPlugin:
         if not found_instances:
             print("[Plugin] WARNING: The plugin \"%s\" was detected, but no instances of the plugin were found. If this is a package, make sure your Plugin subclass is imported in __init__.py." % self.name())
             self.unload()
+        self.manager.plugins_changed()
 
 
     def unload(self):
         self.enabled = False
+        if self.host is not None:
+            self.host.stop()
+            self.host = None
         if self.manager.app and hasattr(self.manager.app, '_parsers'):
             for parser in self.manager.app._parsers:
                 self.hook(Plugin.on_parser_unload, self.instances, parser)
         self.hook(Plugin.on_app_quit, self.instances, self.manager.app)
         self.hook(Plugin.on_unload, self.instances, self.manager.app)
         self.instances = set()
+        self.manager.plugins_changed()
 
     def hook(self, hook_name, instances, *kargs, **kwargs):
         if instances is None:
             instances = self.instances
 
         if not isinstance(hook_name, str):
-            self.hook(hook_name.__name__, instances, *kargs, **kwargs)
-            return
+            hook_name = hook_name.__name__
+
+        for hook in self.hooks(hook_name, instances):
+            self.call(hook_name, hook, *kargs, **kwargs)
 
+    def hooks(self, hook_name, instances=None):
+        """Returns the bound hook_name of the instances that override it."""
+        if instances is None:
+            instances = self.instances
+        default = getattr(Plugin, hook_name, None)
+        hooks = []
         for instance in instances:
-            hook = getattr(instance, hook_name)
-            if hook is None:
-                continue
+            hook = getattr(instance, hook_name, None)
+            if hook is None or \
+                    getattr(type(instance), hook_name, None) is default:
+                continue  # disabled, or the no-op of Plugin
+            hooks.append(hook)
+        return hooks
+
+    def call(self, hook_name, hook, *kargs, **kwargs):
+        """
+        Calls and times hook, in safe mode unloading the plugin if it
+        throws.
+        """
+        started = time.perf_counter()
+        try:
             if self.manager.is_in_safe_mode():
                 try:
                     hook(*kargs, **kwargs)
@@ -121,6 +193,56 @@ class MetaPlugin:
                         self.unload()
             else:
                 hook(*kargs, **kwargs)
+        finally:
+            self._timed(hook_name, time.perf_counter() - started)
+
+    def _timed(self, hook_name, seconds):
+        profile = self.profiles.get(hook_name)
+        if profile is None:
+            profile = self.profiles[hook_name] = HookProfile()
+        profile.add(seconds)
+
+        budget = config.data['general']['plugin_budget']
+        if not budget or seconds * 1000 <= budget or not self.is_enabled():
+            return
+        self.overruns += 1
+        # only a plugin going over budget again and again is unloaded, not
+        # one with a few slow calls spread over a long session
+        now = time.monotonic()
+        self._strikes.append(now)
+        while self._strikes[0] < now - BUDGET_WINDOW:
+            self._strikes.popleft()
+        if self.overruns == 1:
+            print("[Plugin] WARNING: Plugin \"%s\" took %.0f msec in the hook \"%s\", over its %d msec budget." % (self.name(), seconds * 1000, hook_name, budget))
+        if len(self._strikes) == BUDGET_STRIKES:
+            if config.data['general']['plugin_budget_unload']:
+                print("[Plugin] Plugin \"%s\" unloaded because it went over its %d msec budget %d times in %d seconds." % (self.name(), budget, BUDGET_STRIKES, BUDGET_WINDOW))
+                self.unload()
+            else:
+                print("[Plugin] WARNING: Plugin \"%s\" keeps going over its %d msec budget." % (self.name(), budget))
+
+    def profile(self):
+        """Returns the HookProfile.summary() of each hook and of them all."""
+        summary = {hook_name: profile.summary()
+                   for hook_name, profile in sorted(self.profiles.items())}
+        summary['all'] = HookProfile.summary_of(self.profiles.values())
+        if self.host is not None:
+            summary['all']['dropped_lines'] = self.host.dropped
+        return summary
+
+    def subscriptions(self):
+        """Returns [(pattern, handler)] of the instances' subscribed methods."""
+        subscriptions = []
+        for instance in self.instances:
+            for name, member in inspect.getmembers(type(instance)):
+                for pattern in getattr(member, '__subscriptions__', ()):
+                    subscriptions.append((pattern, partial(
+                        self._deliver, name, getattr(instance, name))))
+        return subscriptions
+
+    def _deliver(self, hook_name, handler, *kargs):
+        if self.is_ready():  # not unloaded since the index was built
+            self.call(hook_name, handler, *kargs)
 
 
 class PluginManager:
@@ -129,6 +251,9 @@ class PluginManager:
         self.app = app
         self.directory = directory
         self.plugins = set()
+        self._routes = []  # [(event type, handler)] of subscriptions
+        self._hooks = {}  # hook name : [(MetaPlugin, bound hook)]
+        self._line_triggers = None  # TriggerSet of regex subscriptions
 
     def is_in_safe_mode(self):
         return config.data['general']['safe_mode']
@@ -164,15 +289,93 @@ class PluginManager:
             plugin = MetaPlugin(filepath, self)
             plugins.add(plugin)
         self.plugins.update(plugins)
+        self.plugins_changed()
         if enable_all:
             for plugin in plugins:
                 plugin.load()
 
+    def plugins_changed(self):
+        """Drops the dispatch tables, called when a plugin loads or unloads."""
+        self._hooks = {}
+
+    def _dispatch_table(self, hook_name):
+        table = self._hooks.get(hook_name)
+        if table is None:
+            table = [(plugin, hook) for plugin in self.plugins
+                     if plugin.is_ready()
+                     for hook in plugin.hooks(hook_name)]
+            self._hooks[hook_name] = table
+        return table
+
     def hook(self, hook_name, *kargs, **kwargs):
+        if not isinstance(hook_name, str):
+            hook_name = hook_name.__name__
+        # built once per hook until a plugin loads or unloads
+        for plugin, hook in self._dispatch_table(hook_name):
+            plugin.call(hook_name, hook, *kargs, **kwargs)
+
+    def update_subscriptions(self):
+        """Indexes the subscriptions of the loaded plugins."""
+        routes, line_triggers = [], []
         for plugin in self.plugins:
             if not plugin.is_ready():
                 continue
-            plugin.hook(hook_name, plugin.instances, *kargs, **kwargs)
+            for pattern, handler in plugin.subscriptions():
+                if isinstance(pattern, type) and \
+                        issubclass(pattern, events.LogEvent):
+                    routes.append((pattern, handler))
+                else:
+                    line_triggers.append((handler, pattern))
+        self._routes = routes
+        self._line_triggers = TriggerSet(line_triggers) \
+            if line_triggers else None
+
+    def routes(self):
+        """Returns [(event type, handler)] delivering the subscriptions."""
+        if self._line_triggers is None:
+            return list(self._routes)
+        return self._routes + [(events.Line, self._match_line)]
+
+    def line_filter(self):
+        """
+        Returns the LineFilter arguments of the subscriptions and isolated
+        plugins, or None.
+        """
+        filters = [events.line_filter(
+            event_type for event_type, _ in self._routes)]
+        if self._line_triggers is not None:
+            filters.append(self._line_triggers.line_filter())
+        filters.extend(plugin.host.line_filter for plugin in self.plugins
+                       if plugin.is_ready() and plugin.host is not None)
+        if None in filters:
+            return None
+        return {'prefixes': [prefix for line_filter in filters
+                             for prefix in line_filter['prefixes']],
+                'literals': [literal for line_filter in filters
+                             for literal in line_filter['literals']]}
+
+    def send_lines(self, lines):
+        """Sends LogLine records to the plugins isolated in processes."""
+        for plugin in self.plugins:
+            if plugin.is_ready() and plugin.host is not None:
+                plugin.host.send_lines(lines)
+
+    def stop_hosts(self):
+        """Stops the processes of isolated plugins, called on quit."""
+        for plugin in self.plugins:
+            if plugin.host is not None:
+                plugin.unload()
+
+    def _match_line(self, line):
+        # one literal scan for every plugin, see helpers.triggers
+        for handler, match in self._line_triggers.matches(line.text):
+            handler(line, match)
+
+    def implements(self, hook_name):
+        """Returns True when a loaded plugin overrides the hook."""
+        if not isinstance(hook_name, str):
+            hook_name = hook_name.__name__
+        return bool(self._dispatch_table(hook_name))
 
     def prepare_plugin_menu(self, menu):
         if not self.has_plugins():
@@ -187,7 +390,24 @@ class PluginManager:
             action.setChecked(plugin.is_enabled())
             plugins_options[action] = plugin
 
+        plugins_menu.addSeparator()
+        profile_menu = plugins_menu.addMenu('Profile')
+        for plugin in sorted(self.plugins, key=lambda plugin: plugin.name()):
+            profile = plugin.profile()['all']
+            profile_menu.addAction(
+                '{}: {} calls, {:.0f} msec, p50 {:.1f} / p99 {:.1f} / '
+                'max {:.1f} msec'.format(
+                    plugin.name().capitalize(), profile['calls'],
+                    profile['total_msec'], profile['p50_msec'],
+                    profile['p99_msec'], profile['max_msec'])
+            ).setEnabled(False)
+        profile_menu.addSeparator()
+        export_action = profile_menu.addAction('Export...')
+
         def on_click(action):
+            if action == export_action:
+                self.export_profile()
+                return
             plugin = plugins_options.get(action)
             if plugin is None:
                 return
@@ -198,6 +418,19 @@ class PluginManager:
 
         return on_click
 
+    def export_profile(self, filename=None):
+        """Writes every plugin's profile() as JSON, asks where if no filename."""
+        if filename is None:
+            filename, _ = QFileDialog.getSaveFileName(
+                None, 'Export Plugin Profile', 'nparse_plugins.json',
+                'JSON (*.json)')
+            if not filename:
+                return
+        with open(filename, 'w') as f:
+            f.write(json.dumps(
+                {plugin.name(): plugin.profile() for plugin in self.plugins},
+                indent=4, sort_keys=True))
+
     def extend(self, original, extension):
         pass
 
@@ -205,6 +438,48 @@ class PluginManager:
         pass
 
 
+class HookProfile:
+    """Call count, total time and recent latencies of a plugin hook."""
+
+    SAMPLES = 1000  # latencies kept for the percentiles
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=self.SAMPLES)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        return HookProfile.summary_of([self])
+
+    @staticmethod
+    def summary_of(profiles):
+        """Returns calls and msec totals of profiles merged, for JSON."""
+        profiles = list(profiles)
+        samples = sorted(seconds for profile in profiles
+                         for seconds in profile.samples)
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1,
+                               int(len(samples) * fraction))] * 1000
+
+        return {
+            'calls': sum(profile.calls for profile in profiles),
+            'total_msec': sum(profile.seconds for profile in profiles) * 1000,
+            'p50_msec': percentile(0.5),
+            'p99_msec': percentile(0.99),
+            'max_msec': max([profile.max for profile in profiles] or [0]) * 1000,
+        }
+
+
 class ClassExtension:
     @classmethod
     def get(cls, class_):
@@ -226,18 +501,31 @@ class ClassExtension:
     def __init__(self, class_):
         self.class_ = class_
         self.impl = {}
+        self._next = {}  # implementation : the one it extends
 
     def super(self, method, obj, *kargs, **kwargs):
+        next_implementation = self._next.get(method)
+        if next_implementation is None:
+            next_implementation = self._resolve(method)
+        return next_implementation(obj, *kargs, **kwargs)
+
+    def _resolve(self, method):
+        """Finds the next implementation of a method not in the chains."""
         implementations = self.impl.get(method.__name__, [])
-        if not implementations or method not in implementations:
-            if not implementations:
-                return getattr(self.class_, method.__name__)(obj, *kargs, **kwargs)
-            else:
-                return implementations[-1](obj, *kargs, **kwargs)
-        index = implementations.index(method)
-        if index == 0:
-            raise Exception("You are calling the most original implementation of %s" % str(method.__name__))
-        return implementations[index - 1](obj, *kargs, **kwargs)
+        if not implementations:
+            return getattr(self.class_, method.__name__)
+        if method not in implementations:
+            return implementations[-1]
+        raise Exception("You are calling the most original implementation of %s" % str(method.__name__))
+
+    def _compile(self):
+        """Links each implementation to the one before it, on every change."""
+        self._next = {
+            implementation: implementations[index - 1]
+            for implementations in self.impl.values()
+            for index, implementation in enumerate(implementations)
+            if index > 0
+        }
 
     def extend_class(self, extension):
         for name, member in inspect.getmembers(extension):
@@ -256,6 +544,7 @@ class ClassExtension:
                 'extension_type': 'ADDING NEW' if original_member is None else 'EXTENDING',
                 'method_name': name,
             })
+        self._compile()
 
     def reduce_class(self, extension):
         for name, member in inspect.getmembers(extension):
@@ -275,7 +564,7 @@ class ClassExtension:
             else:
                 delattr(self.class_, name)
             self.impl[name] = implementations
-
+        self._compile()
 
 
 
@@ -0,0 +1,42 @@
+from helpers import logscan
+
+
+def write_log(tmp_path, text):
+    path = tmp_path / 'eqlog_Bob_P1999Green.txt'
+    path.write_bytes(text.encode('latin-1'))
+    return str(path)
+
+
+def test_last_state_keeps_lines_of_one_second_in_log_order(tmp_path):
+    path = write_log(
+        tmp_path,
+        '[Mon Oct 18 18:00:00 2026] You have entered West Freeport.\n'
+        '[Mon Oct 18 18:00:05 2026] You have entered East Commonlands.\n'
+        '[Mon Oct 18 18:00:05 2026] Your Location is 1.0, 2.0, 3.0\n')
+    records = logscan.last_state(path)
+    assert [record.text for record in records] == [
+        'You have entered East Commonlands.',
+        'Your Location is 1.0, 2.0, 3.0',
+    ]
+    assert records[0].charname == 'Bob'
+
+
+def test_last_state_offsets_point_at_the_lines(tmp_path):
+    text = ('[Mon Oct 18 18:00:00 2026] You have gained a level! '
+            'Welcome to level 12!\n'
+            '[Mon Oct 18 18:00:01 2026] a gnoll hits YOU for 3 points '
+            'of damage.\n'
+            '[Mon Oct 18 18:00:02 2026] You have entered Freeport.\n')
+    path = write_log(tmp_path, text)
+    for record in logscan.last_state(path):
+        assert text[record.offset:].split('\n', 1)[0].endswith(record.text)
+
+
+def test_read_backwards_across_blocks(tmp_path):
+    lines = ['[Mon Oct 18 18:00:00 2026] line %d' % i for i in range(50)]
+    path = write_log(tmp_path, '\n'.join(lines) + '\n')
+    text = '\n'.join(lines) + '\n'
+    found = list(logscan.read_backwards(path, block_size=64))
+    assert [line.decode() for _, line in found] == lines[::-1]
+    for offset, line in found:
+        assert text[offset:offset + len(line)] == line.decode()
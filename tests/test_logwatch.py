@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+from helpers import logreader
+from helpers.logwatch import InotifyLogWatcher
+
+LINE = '[Mon Oct 18 18:00:0{} 2026] {}\n'
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def run(app, seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def rename_away(path):
+    os.rename(path, str(path) + '.1')
+    path.write_text(LINE.format(2, 'new file 1'))
+
+
+def replace(path):
+    new = path.with_name('new.tmp')
+    new.write_text(LINE.format(2, 'new file 1'))
+    os.replace(new, path)
+
+
+@pytest.mark.parametrize('rotate', [rename_away, replace])
+@pytest.mark.parametrize('watcher', ['qt', 'inotify', 'polling'])
+def test_rotated_log_keeps_being_read(app, tmp_path, monkeypatch, watcher,
+                                      rotate):
+    if watcher == 'inotify' and not InotifyLogWatcher.available():
+        pytest.skip('inotify is not available')
+    monkeypatch.chdir(tmp_path)  # the reader saves its offsets here
+    logs = tmp_path / 'logs'
+    logs.mkdir()
+    path = logs / 'eqlog_Bob_P1999Green.txt'
+    path.write_text(LINE.format(0, 'before start'))
+
+    reader = logreader.LogReader(
+        str(logs), batch_size=50, flush_latency=10, watcher=watcher)
+    lines = []
+    reader.new_lines.connect(lambda batch: lines.extend(batch))
+    try:
+        run(app, 0.3)
+        with open(path, 'a') as log:
+            log.write(LINE.format(1, 'old file'))
+        run(app, 0.5)
+        rotate(path)
+        run(app, 0.5)
+        with open(path, 'a') as log:
+            log.write(LINE.format(3, 'new file 2'))
+        run(app, 2.5)  # the polling watcher backs off while idle
+    finally:
+        reader.stop()
+
+    assert [line.text for line in lines] == [
+        'old file', 'new file 1', 'new file 2']